@@ -1,12 +1,13 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
 from flask_httpauth import HTTPBasicAuth
 from werkzeug.security import generate_password_hash, check_password_hash
 import config
-from storage import Database
-from fetcher import MatchFetcher
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from storage import Database, USER_SORTS
+from fetcher import MatchFetcher, normalize_name
+from jobs import NOTIFY_ALL, CLEANUP_USERS, MAINTENANCE
 import asyncio
+import hashlib
+import json
 import nest_asyncio
 from bot_manager import get_bot
 
@@ -18,10 +19,10 @@ auth = HTTPBasicAuth()
 db = Database()
 
 # Use database to queue messages instead of directly sending them
-def send_message_via_db_queue(chat_id: int, text: str):
+def send_message_via_db_queue(chat_id: int, text: str, city: str = None):
     """Queue a message in the database to be sent by the bot process"""
-    return db.queue_message(telegram_id=chat_id, message=text)
-fetcher = MatchFetcher()
+    return db.queue_message(telegram_id=chat_id, message=text, city=normalize_name(city) if city else None)
+fetcher = MatchFetcher(db)
 
 users = {
     config.ADMIN_USERNAME: generate_password_hash(config.ADMIN_PASSWORD)
@@ -32,16 +33,76 @@ def verify_password(username, password):
     if username in users and check_password_hash(users.get(username), password):
         return username
 
+def _user_page_args() -> dict:
+    """Read the search, sort and pagination parameters of the user list"""
+    sort = request.args.get('sort', 'id')
+    try:
+        limit = int(request.args.get('limit', config.ADMIN_PAGE_SIZE))
+    except ValueError:
+        limit = config.ADMIN_PAGE_SIZE
+    return {
+        'search': request.args.get('q', '').strip(),
+        'sort': sort if sort in USER_SORTS else USER_SORTS[0],
+        'cursor': request.args.get('cursor') or None,
+        'limit': max(1, min(limit, config.ADMIN_MAX_PAGE_SIZE))
+    }
+
 @app.route('/')
 @auth.login_required
 def index():
     access_mode = db.get_access_mode()
-    all_users = db.get_all_users()
+    page_args = _user_page_args()
+    try:
+        user_rows, next_cursor = db.get_user_page(**page_args)
+    except ValueError:
+        flash('Invalid page, showing the first one', 'error')
+        page_args['cursor'] = None
+        user_rows, next_cursor = db.get_user_page(**page_args)
     return render_template('admin.html', 
-                         users=all_users, 
+                         users=user_rows, 
                          access_mode=access_mode,
                          current_mode=access_mode,
-                         db=db)
+                         queue_stats=db.get_queue_stats(),
+                         match_stats=db.get_match_stats(),
+                         archive_stats=db.get_message_archive_stats(),
+                         last_maintenance=db.get_latest_job(MAINTENANCE),
+                         recent_jobs=db.get_recent_jobs(),
+                         search=page_args['search'],
+                         sort=page_args['sort'],
+                         cursor=page_args['cursor'],
+                         next_cursor=next_cursor)
+
+@app.route('/api/users')
+@auth.login_required
+def api_users():
+    page_args = _user_page_args()
+    # The fingerprint is a handful of aggregates, far cheaper than building the page
+    fingerprint = json.dumps([db.get_users_fingerprint(), page_args], sort_keys=True)
+    etag = hashlib.sha1(fingerprint.encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"'}
+
+    try:
+        user_rows, next_cursor = db.get_user_page(**page_args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = jsonify({
+        'users': [
+            {
+                'telegram_id': row.telegram_id,
+                'username': row.username,
+                'city': row.city,
+                'last_notification': row.last_notification.isoformat() if row.last_notification else None,
+                'has_access': row.has_access,
+                'is_active': row.is_active
+            }
+            for row in user_rows
+        ],
+        'next_cursor': next_cursor
+    })
+    response.set_etag(etag)
+    return response
 
 @app.route('/set_mode', methods=['POST'])
 @auth.login_required
@@ -74,66 +135,45 @@ def toggle_access(user_id):
 @auth.login_required
 def cleanup_users():
     try:
-        # Queue a special admin operation in the database
-        # The bot will recognize this and perform the cleanup
-        db.queue_message(telegram_id=0, message="ADMIN_OPERATION:CLEANUP_USERS")
-        flash("User cleanup operation has been queued. Check back later for results.", 'info')
+        # The bot process probes every user in the background
+        job_id = db.create_job(CLEANUP_USERS)
+        flash(f"User cleanup job #{job_id} queued. Check back later for results.", 'info')
     except Exception as e:
         flash(f'Error during cleanup: {str(e)}', 'error')
     
     return redirect(url_for('index'))
 
+@app.route('/maintenance', methods=['POST'])
+@auth.login_required
+def run_maintenance():
+    try:
+        job_id = db.create_job(MAINTENANCE)
+        flash(f"Maintenance job #{job_id} queued. Progress: {url_for('job_status', job_id=job_id)}", 'info')
+    except Exception as e:
+        flash(f'Error queueing maintenance: {str(e)}', 'error')
+
+    return redirect(url_for('index'))
+
 @app.route('/notify_all', methods=['POST'])
 @auth.login_required
 def notify_all():
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        users = db.get_all_users()
-        notifications_sent = 0
-        no_matches = 0
-        already_notified = 0
-        
-        current_utc = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC"))
-        
-        for user in users:
-            try:
-                if user.last_notification:
-                    last_notif = user.last_notification
-                    if last_notif.tzinfo is None:
-                        last_notif = last_notif.replace(tzinfo=ZoneInfo("UTC"))
-                    if last_notif.date() == current_utc.date():
-                        already_notified += 1
-                        continue
-                
-                message = fetcher.check_matches_for_city(user.city)
-                if message:
-                    send_message_via_db_queue(
-                        chat_id=user.telegram_id,
-                        text=message
-                    )
-                    db.update_last_notification(user.telegram_id)
-                    notifications_sent += 1
-                else:
-                    no_matches += 1
-                    
-            except Exception as e:
-                flash(f'Error processing user {user.telegram_id}: {str(e)}', 'error')
-                
-        summary = f'Notifications sent: {notifications_sent}, No matches: {no_matches}, Already notified today: {already_notified}'
-        flash(summary, 'success' if notifications_sent > 0 else 'info')
-            
+        # The bot process runs the fan-out; the request only queues the job
+        job_id = db.create_job(NOTIFY_ALL)
+        flash(f"Notification job #{job_id} queued. Progress: {url_for('job_status', job_id=job_id)}", 'info')
     except Exception as e:
         flash(f'Error in notify_all: {str(e)}', 'error')
-    finally:
-        try:
-            loop.close()
-        except:
-            pass
     
     return redirect(url_for('index'))
 
+@app.route('/jobs/<int:job_id>')
+@auth.login_required
+def job_status(job_id):
+    job = db.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/notify_user/<int:user_id>', methods=['POST'])
 @auth.login_required
 def notify_user(user_id):
@@ -155,7 +195,8 @@ def notify_user(user_id):
         if message:
             send_message_via_db_queue(
                 chat_id=user_id,
-                text=message
+                text=message,
+                city=user.city
             )
             db.update_last_notification(user_id, is_manual=True)
             flash(f'Notification sent to user {user_id}', 'success')
@@ -200,7 +241,8 @@ def test_notification(user_id):
 
         send_message_via_db_queue(
             chat_id=user_id,
-            text=message
+            text=message,
+            city=user.city
         )
         db.update_last_notification(user_id, is_manual=True)
         flash(f'Test notification sent to user {user_id}', 'success')
@@ -215,5 +257,10 @@ def test_notification(user_id):
     
     return redirect(url_for('index'))
 
+@app.route('/diagnostics/query_plans')
+@auth.login_required
+def query_plans():
+    return jsonify(db.explain_query_plans())
+
 def run_admin_interface():
     app.run(host='0.0.0.0', port=config.ADMIN_PORT)
@@ -28,9 +28,61 @@ if not TELEGRAM_BOT_TOKEN:
 FOOTBALL_API_TOKEN = os.getenv('FOOTBALL_API_TOKEN')
 if not FOOTBALL_API_TOKEN:
     logger.error("FOOTBALL_API_TOKEN is not set in environment variables")
+FOOTBALL_API_CONNECT_TIMEOUT = float(os.getenv('FOOTBALL_API_CONNECT_TIMEOUT', '5'))
+FOOTBALL_API_READ_TIMEOUT = float(os.getenv('FOOTBALL_API_READ_TIMEOUT', '20'))
+FOOTBALL_API_MAX_RETRIES = int(os.getenv('FOOTBALL_API_MAX_RETRIES', '3'))
+FOOTBALL_API_BACKOFF_SECONDS = float(os.getenv('FOOTBALL_API_BACKOFF_SECONDS', '1'))
+FOOTBALL_API_BACKOFF_MAX_SECONDS = float(os.getenv('FOOTBALL_API_BACKOFF_MAX_SECONDS', '30'))
+
+# SQLite settings
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '16384'))
+SQLITE_MMAP_SIZE_MB = int(os.getenv('SQLITE_MMAP_SIZE_MB', '64'))
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+# How stale the in-memory access lists may get before the version counter is checked again
+ACCESS_CACHE_TTL_SECONDS = float(os.getenv('ACCESS_CACHE_TTL_SECONDS', '2'))
+
+# Match cache settings
+# Days of past matches kept in the database
+MATCH_RETENTION_DAYS = int(os.getenv('MATCH_RETENTION_DAYS', '7'))
+# How long "no matches on this date" is remembered before asking the API again
+MATCH_NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv('MATCH_NEGATIVE_CACHE_TTL_SECONDS', '900'))
+# Days fetched in one request before the notification window; football-data.org allows at most 10 (incl. padding)
+MATCH_PREFETCH_DAYS = min(int(os.getenv('MATCH_PREFETCH_DAYS', '7')), 8)
+MATCH_PREFETCH_LEAD_MINUTES = int(os.getenv('MATCH_PREFETCH_LEAD_MINUTES', '30'))
+
+# Message queue sender settings
+SENDER_MAX_IN_FLIGHT = int(os.getenv('SENDER_MAX_IN_FLIGHT', '20'))
+SENDER_BATCH_SIZE = int(os.getenv('SENDER_BATCH_SIZE', '100'))
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', '1'))
+QUEUE_MAX_ATTEMPTS = int(os.getenv('QUEUE_MAX_ATTEMPTS', '5'))
+QUEUE_RETRY_BASE_SECONDS = int(os.getenv('QUEUE_RETRY_BASE_SECONDS', '30'))
+QUEUE_RETRY_MAX_SECONDS = int(os.getenv('QUEUE_RETRY_MAX_SECONDS', '3600'))
+QUEUE_LEASE_SECONDS = int(os.getenv('QUEUE_LEASE_SECONDS', '120'))
+SENDER_WORKERS = int(os.getenv('SENDER_WORKERS', '1'))
+QUEUE_POLL_INTERVAL_SECONDS = float(os.getenv('QUEUE_POLL_INTERVAL_SECONDS', '15'))
+
+# Admin job settings
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv('JOB_POLL_INTERVAL_SECONDS', '30'))
+JOB_PROGRESS_INTERVAL_SECONDS = float(os.getenv('JOB_PROGRESS_INTERVAL_SECONDS', '1'))
+CLEANUP_CONCURRENCY = int(os.getenv('CLEANUP_CONCURRENCY', '10'))
+CLEANUP_PAGE_SIZE = int(os.getenv('CLEANUP_PAGE_SIZE', '200'))
+
+# Maintenance job settings
+MAINTENANCE_HOUR = int(os.getenv('MAINTENANCE_HOUR', '4'))
+QUEUE_SENT_RETENTION_DAYS = int(os.getenv('QUEUE_SENT_RETENTION_DAYS', '7'))
+QUEUE_DEAD_LETTER_RETENTION_DAYS = int(os.getenv('QUEUE_DEAD_LETTER_RETENTION_DAYS', '30'))
+# Rows archived and deleted per transaction; kept below SQLite's bound parameter limit
+QUEUE_ARCHIVE_BATCH_SIZE = min(int(os.getenv('QUEUE_ARCHIVE_BATCH_SIZE', '500')), 900)
+# VACUUM rewrites the whole file, so only do it once this share of the pages is free
+MAINTENANCE_VACUUM_FREE_RATIO = float(os.getenv('MAINTENANCE_VACUUM_FREE_RATIO', '0.25'))
 
 # Admin interface settings
 ADMIN_PORT = int(os.getenv('ADMIN_PORT', '5000'))
 ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin')
 FLASK_SECRET_KEY = os.getenv('FLASK_SECRET_KEY') or os.urandom(24)
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '50'))
+ADMIN_MAX_PAGE_SIZE = 200
@@ -3,15 +3,44 @@ nest_asyncio.apply()
 
 import asyncio
 import logging
+from telegram import Bot as TelegramBot
 from telegram.ext import Application
-from telegram.error import TelegramError
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
 
 logger = logging.getLogger(__name__)
 
+# Categories of failed sends
+SEND_ERROR_BLOCKED = 'blocked'
+SEND_ERROR_DEACTIVATED = 'deactivated'
+SEND_ERROR_CHAT_NOT_FOUND = 'chat_not_found'
+SEND_ERROR_TRANSIENT = 'transient'
+SEND_ERROR_OTHER = 'other'
+
+# The chat is gone for good: retrying can't succeed until the user comes back
+UNREACHABLE_CHAT_ERRORS = frozenset({SEND_ERROR_BLOCKED, SEND_ERROR_DEACTIVATED})
+
+def classify_send_error(error: Exception) -> str:
+    """Map a Telegram error to one of the SEND_ERROR_* categories"""
+    message = str(error).lower()
+    if isinstance(error, Forbidden):
+        if "blocked" in message:
+            return SEND_ERROR_BLOCKED
+        if "deactivated" in message:
+            return SEND_ERROR_DEACTIVATED
+        return SEND_ERROR_OTHER
+    if isinstance(error, BadRequest):
+        # BadRequest derives from NetworkError but is never transient
+        return SEND_ERROR_CHAT_NOT_FOUND if "chat not found" in message else SEND_ERROR_OTHER
+    if isinstance(error, NetworkError):
+        return SEND_ERROR_TRANSIENT
+    return SEND_ERROR_OTHER
+
 class Bot:
     def __init__(self, token):
         if not token:
             raise ValueError("Bot token cannot be empty")
+        self.token = token
         self.app = Application.builder().token(token).build()
         self.bot = self.app.bot
         self._loop = None
@@ -24,37 +53,58 @@ class Bot:
             asyncio.set_event_loop(self._loop)
         return self._loop
 
-    async def _send_message_async(self, chat_id: int, text: str):
+    def create_sender_bot(self, connection_pool_size: int) -> TelegramBot:
+        """Create a separate Telegram client for sending from another event loop"""
+        return TelegramBot(
+            token=self.token,
+            request=HTTPXRequest(connection_pool_size=connection_pool_size)
+        )
+
+    async def _send_message_async(self, chat_id: int, text: str, bot: TelegramBot = None):
+        """Send a message and return (success, error, error category)"""
         try:
-            await self.bot.send_message(chat_id=chat_id, text=text)
-            return True, None
+            await (bot or self.bot).send_message(chat_id=chat_id, text=text)
+            return True, None, None
+        except RetryAfter:
+            # Let the caller decide how to honor flood control
+            raise
         except TelegramError as e:
-            logger.error(f"Telegram error sending message to {chat_id}: {str(e)}")
-            return False, str(e)
+            category = classify_send_error(e)
+            if category in UNREACHABLE_CHAT_ERRORS:
+                logger.info(f"Chat {chat_id} is unreachable ({category}): {str(e)}")
+            else:
+                logger.error(f"Telegram error sending message to {chat_id}: {str(e)}")
+            return False, str(e), category
         except Exception as e:
             logger.error(f"Unexpected error sending message to {chat_id}: {str(e)}")
-            return False, str(e)
+            return False, str(e), SEND_ERROR_OTHER
 
     def send_message_sync(self, chat_id: int, text: str):
         loop = self._get_event_loop()
         
         try:
-            success, error = loop.run_until_complete(self._send_message_async(chat_id, text))
+            success, error, _ = loop.run_until_complete(self._send_message_async(chat_id, text))
             if not success:
                 logger.warning(f"Failed to send message to {chat_id}: {error}")
                 return False
             return True
+        except RetryAfter as e:
+            logger.warning(f"Flood control exceeded sending message to {chat_id}, retry in {e.retry_after}s")
+            return False
         except RuntimeError as e:
             logger.error(f"Runtime error in event loop: {str(e)}")
             self._loop = None
             loop = self._get_event_loop()
             
             try:
-                success, error = loop.run_until_complete(self._send_message_async(chat_id, text))
+                success, error, _ = loop.run_until_complete(self._send_message_async(chat_id, text))
                 if not success:
                     logger.error(f"Failed to send message after loop reset: {error}")
                     return False
                 return True
+            except RetryAfter as e:
+                logger.warning(f"Flood control exceeded sending message to {chat_id}, retry in {e.retry_after}s")
+                return False
             except Exception as e:
                 logger.error(f"Fatal error sending message to {chat_id}: {str(e)}")
                 return False
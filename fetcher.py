@@ -1,96 +1,314 @@
 import os
 import json
+import random
 import requests
+import time
 import yaml
 import logging
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import config
 import glob
+import threading
+import unicodedata
+from types import MappingProxyType
+from requests.adapters import HTTPAdapter
+from storage import Database, file_lock as _file_lock
 
 logger = logging.getLogger(__name__)
 
-class MatchFetcher:
-    def __init__(self):
-        self.headers = {
-            'X-Auth-Token': config.FOOTBALL_API_TOKEN
-        }
-        self.base_url = "http://api.football-data.org/v4"
-        self.teams_config = self._load_teams_config()
-        self.data_dir = os.path.join(os.path.dirname(__file__), 'data')
-        os.makedirs(self.data_dir, exist_ok=True)
+# Number of per-day match indexes kept in memory by each fetcher
+MAX_CACHED_INDEXES = 7
+
+# Version of the compact match format of the JSON cache files used before the matches table
+CACHE_SCHEMA_VERSION = 2
+
+def compact_matches(data: dict) -> dict:
+    """Reduce an API payload to the Serie A fields the bot uses"""
+    return {
+        'schema': CACHE_SCHEMA_VERSION,
+        'matches': [
+            {
+                'utcDate': match.get('utcDate'),
+                'home': match.get('homeTeam', {}).get('shortName'),
+                'away': match.get('awayTeam', {}).get('shortName', 'Unknown'),
+                'status': match.get('status')
+            }
+            for match in data.get('matches', [])
+            if match.get('competition', {}).get('code') == 'SA' and match.get('utcDate')
+        ]
+    }
+
+def normalize_name(name: str) -> str:
+    """Case- and accent-insensitive lookup key for team and city names"""
+    if not name:
+        return None
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split()) or None
+
+def _load_teams_config() -> dict:
+    config_path = os.path.join(os.path.dirname(__file__), 'teams.yml')
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+class TeamIndex:
+    """Inverted team→city lookup compiled from teams.yml"""
+
+    def __init__(self, teams_config: dict):
+        self.area_ids = MappingProxyType(dict(teams_config.get('area_ids') or {}))
+
+        team_cities = {}
+        for city, teams in (teams_config.get('cities') or {}).items():
+            city_key = normalize_name(city)
+            for team in teams or []:
+                team_cities[normalize_name(team)] = city_key
+
+        for team, aliases in (teams_config.get('aliases') or {}).items():
+            city_key = team_cities.get(normalize_name(team))
+            if city_key is None:
+                logger.warning(f"Ignoring aliases for unknown team '{team}' in teams.yml")
+                continue
+            for alias in aliases or []:
+                team_cities[normalize_name(alias)] = city_key
+
+        self._team_cities = MappingProxyType(team_cities)
+        self.cities = frozenset(team_cities.values())
+
+    def city_for(self, team_name: str) -> str:
+        """Get the normalized city of a team, or None if the team is unknown"""
+        key = normalize_name(team_name)
+        return self._team_cities.get(key) if key else None
+
+    def __len__(self) -> int:
+        return len(self._team_cities)
+
+_team_index = None
+_team_index_lock = threading.Lock()
+
+def get_team_index() -> TeamIndex:
+    """Get the team index shared by all fetchers, compiling teams.yml on first use"""
+    global _team_index
+    if _team_index is None:
+        with _team_index_lock:
+            if _team_index is None:
+                _team_index = TeamIndex(_load_teams_config())
+                logger.info(f"Compiled team index: {len(_team_index)} teams in {len(_team_index.cities)} cities")
+    return _team_index
+
+class MatchIndex:
+    """Immutable view of one day's Serie A matches, already localized and grouped by city"""
+    __slots__ = ('date', '_by_city')
+
+    def __init__(self, date, matches_by_city: dict):
+        self.date = date
+        self._by_city = MappingProxyType({
+            city: tuple(MappingProxyType(match) for match in matches)
+            for city, matches in matches_by_city.items()
+        })
+
+    def matches_for(self, city: str) -> tuple:
+        """Get the matches for an already normalized city name"""
+        return self._by_city.get(city, ())
+
+    def __len__(self) -> int:
+        return len(self._by_city)
 
-    def _load_teams_config(self) -> dict:
-        config_path = os.path.join(os.path.dirname(__file__), 'teams.yml')
-        with open(config_path, 'r') as f:
-            return yaml.safe_load(f)
+class FootballDataClient:
+    """football-data.org client with keep-alive connections, timeouts, jittered retries
+    and pacing against the per-minute request budget the API reports in its headers"""
 
-    def _get_cache_filename(self, date: datetime) -> str:
-        return os.path.join(self.data_dir, f'matches_{date.strftime("%Y-%m-%d")}.json')
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    # How often callers look again while the new window's reset time is still unknown
+    RESET_POLL_SECONDS = 0.5
 
-    def _cleanup_old_cache_files(self):
+    def __init__(self, base_url: str, token: str):
+        self.base_url = base_url
+        self.timeout = (config.FOOTBALL_API_CONNECT_TIMEOUT, config.FOOTBALL_API_READ_TIMEOUT)
+        self.max_retries = config.FOOTBALL_API_MAX_RETRIES
+        self.session = requests.Session()
+        self.session.headers['X-Auth-Token'] = token or ''
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=4))
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=4))
+        self._available = None
+        self._limit = None
+        # Monotonic end of the server's current window, None until a response reports it
+        self._reset_at = None
+        self._window_start = 0.0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take one request from the budget, or return how long to wait before asking again.
+        Windows only start and end when the server says so (X-RequestCounter-Reset)."""
+        with self._lock:
+            now = time.monotonic()
+            if self._reset_at is not None and now >= self._reset_at:
+                # The server's window is over: the first response of the new one reports when it ends
+                self._available = self._limit
+                self._reset_at = None
+                self._window_start = now
+            if self._available is not None and self._available <= 0:
+                if self._reset_at is not None:
+                    return self._reset_at - now
+                if self._in_flight:
+                    return self.RESET_POLL_SECONDS
+                # No reset time known and no response coming that could tell one
+                self._available = None
+            elif self._available is None and self._in_flight:
+                # Budget unknown: let the request already out find it before sending more
+                return self.RESET_POLL_SECONDS
+            if self._available is not None:
+                self._available -= 1
+            self._in_flight += 1
+            return 0.0
+
+    def _release(self):
+        """A reserved request got no response"""
+        with self._lock:
+            self._in_flight -= 1
+
+    def _update_budget(self, response: requests.Response, sent_at: float):
+        available = response.headers.get('X-Requests-Available-Minute')
+        reset = response.headers.get('X-RequestCounter-Reset')
         try:
-            cache_files = glob.glob(os.path.join(self.data_dir, 'matches_*.json'))
-            
-            if len(cache_files) > 7:
-                cache_files.sort(key=lambda x: os.path.getmtime(x))
-                files_to_delete = cache_files[:-7]
-                for file_path in files_to_delete:
-                    try:
-                        os.remove(file_path)
-                        logger.debug(f"Deleted old cache file: {os.path.basename(file_path)}")
-                    except Exception as e:
-                        logger.error(f"Error deleting cache file {file_path}: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error during cache cleanup: {str(e)}")
+            with self._lock:
+                self._in_flight -= 1
+                if sent_at < self._window_start:
+                    # Counted in the previous window, so its headers say nothing about this one
+                    return
+                if available is not None:
+                    reported = int(available)
+                    self._limit = max(self._limit or 0, reported + 1)
+                    # Responses arrive out of order: within a window the budget only goes down
+                    self._available = reported if self._available is None else min(self._available, reported)
+                if reset is not None:
+                    self._reset_at = time.monotonic() + float(reset)
+                elif response.status_code == 429:
+                    self._reset_at = time.monotonic() + 60
+                if response.status_code == 429:
+                    self._available = 0
+        except ValueError:
+            logger.debug(f"Ignoring malformed rate limit headers: {available!r} / {reset!r}")
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(config.FOOTBALL_API_BACKOFF_MAX_SECONDS,
+                                     config.FOOTBALL_API_BACKOFF_SECONDS * (2 ** attempt)))
 
-    def _load_cached_data(self, date: datetime) -> dict:
-        cache_file = self._get_cache_filename(date)
-        if os.path.exists(cache_file):
+    def get(self, path: str, params: dict = None) -> dict:
+        """GET a JSON resource, retrying connection errors, timeouts, 429s and 5xx responses"""
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            while True:
+                wait = self._reserve()
+                if wait <= 0:
+                    break
+                logger.info(f"football-data.org request budget exhausted, waiting {wait:.1f}s")
+                time.sleep(wait)
+
+            last_attempt = attempt == self.max_retries
+            sent_at = time.monotonic()
             try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                logger.debug(f"Loaded data from cache for {date.strftime('%Y-%m-%d')}")
-                return data
-            except Exception as e:
-                logger.error(f"Error reading cache file: {str(e)}")
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._release()
+                if last_attempt:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Request to {path} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            except Exception:
+                self._release()
+                raise
+
+            self._update_budget(response, sent_at)
+            if response.status_code in self.RETRY_STATUSES and not last_attempt:
+                # On 429 the budget pacing above waits for the counter reset
+                delay = 0.0 if response.status_code == 429 else self._backoff(attempt)
+                logger.warning(f"Request to {path} returned {response.status_code}, retrying")
+                time.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response.json()
+
+# One lock per date, so concurrent callers in a process share a single fetch
+_fetch_locks = {}
+_fetch_locks_guard = threading.Lock()
+
+def _fetch_lock(date_key: str) -> threading.Lock:
+    with _fetch_locks_guard:
+        return _fetch_locks.setdefault(date_key, threading.Lock())
+
+_api_client = None
+_api_client_lock = threading.Lock()
+
+def get_api_client() -> FootballDataClient:
+    """Get the football-data.org client shared by all fetchers, so connections and budget are shared too"""
+    global _api_client
+    if _api_client is None:
+        with _api_client_lock:
+            if _api_client is None:
+                _api_client = FootballDataClient("http://api.football-data.org/v4", config.FOOTBALL_API_TOKEN)
+    return _api_client
+
+class MatchFetcher:
+    def __init__(self, db: Database = None):
+        self.api = get_api_client()
+        self.db = db or Database()
+        self.team_index = get_team_index()
+        self.data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._match_indexes = {}
+        self._index_lock = threading.Lock()
+        self._index_hits = 0
+        self._index_misses = 0
+
+    def _lock_path(self) -> str:
+        return os.path.join(self.data_dir, 'matches.lock')
+
+    def prune_old_matches(self) -> int:
+        """Delete stored matches older than MATCH_RETENTION_DAYS and return how many were removed"""
+        cutoff = datetime.now(ZoneInfo('Europe/Rome')).date() - timedelta(days=config.MATCH_RETENTION_DAYS)
+        deleted = self.db.prune_matches(cutoff.isoformat())
+        if deleted:
+            logger.info(f"Pruned {deleted} matches before {cutoff.isoformat()}")
+        return deleted
+
+    def import_legacy_cache_files(self) -> int:
+        """Move matches_<date>.json files written by older versions into the matches table.
+        Returns the number of files imported."""
+        imported = 0
+        with _file_lock(self._lock_path()):
+            for cache_file in sorted(glob.glob(os.path.join(self.data_dir, 'matches_*.json'))):
+                date_key = os.path.basename(cache_file)[len('matches_'):-len('.json')]
                 try:
-                    # If cache is corrupted, delete it
+                    with open(cache_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if data.get('schema') != CACHE_SCHEMA_VERSION:
+                        data = compact_matches(data)
+                    self._store_matches(data['matches'], [date_key], only_dates=[date_key])
                     os.remove(cache_file)
-                    logger.info(f"Deleted corrupted cache file: {cache_file}")
-                except Exception as del_e:
-                    logger.error(f"Error deleting corrupted cache: {str(del_e)}")
-        return None
-
-    def _save_to_cache(self, date: datetime, data: dict):
-        if not data:
-            logger.warning("Attempted to cache empty data")
-            return
-            
-        cache_file = self._get_cache_filename(date)
-        try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            logger.debug(f"Saved data to cache for {date.strftime('%Y-%m-%d')}")
-        except Exception as e:
-            logger.error(f"Error saving to cache: {str(e)}")
+                    imported += 1
+                    logger.info(f"Imported {os.path.basename(cache_file)} into the matches table")
+                except Exception as e:
+                    logger.error(f"Could not import cache file {cache_file}: {str(e)}")
+            for leftover in glob.glob(os.path.join(self.data_dir, 'matches_*.empty')) + \
+                    glob.glob(os.path.join(self.data_dir, '.matches_*.tmp')):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+        return imported
 
     def _get_team_city(self, team_name: str) -> str:
-        cities = self.teams_config.get('cities', {})
-        if not team_name:
-            return None
-            
-        team_name = team_name.strip()
-        for city, teams in cities.items():
-            if team_name in teams:
-                return city.lower()  # Store cities in lowercase
-        return None
+        return self.team_index.city_for(team_name)
 
     def _normalize_city(self, city: str) -> str:
         """Normalize city name for consistent matching."""
-        if not city:
-            return None
-        return city.strip().lower()
+        return normalize_name(city)
 
     def _format_time(self, utc_time_str: str) -> dict:
         """Convert UTC time string to local time and return formatted dict"""
@@ -105,30 +323,69 @@ class MatchFetcher:
             'datetime': rome_time
         }
 
-    def _is_match_today(self, match_datetime: datetime, reference_date: datetime) -> bool:
-        """Check if match is on the same day as the reference date"""
-        match_date = match_datetime.date()
-        reference_date = reference_date.date()
-        return match_date == reference_date
+    def _store_matches(self, matches: list, complete_dates: list, only_dates: list = None,
+                       empty_expires_at: dict = None) -> dict:
+        """Store compact matches by local day and city. Returns {date: matches} for the complete dates.
+        Complete dates without matches are only trusted until their `empty_expires_at` entry,
+        by default for MATCH_NEGATIVE_CACHE_TTL_SECONDS, since fixtures can still be published or moved onto them."""
+        rows = []
+        for match in matches:
+            times = self._format_time(match['utcDate'])
+            local_date = times['datetime'].date().isoformat()
+            if only_dates is not None and local_date not in only_dates:
+                continue
+            rows.append({
+                'local_date': local_date,
+                'city': self._get_team_city(match.get('home')),
+                'home': match.get('home') or 'Unknown',
+                'away': match.get('away') or 'Unknown',
+                'utc_date': datetime.fromisoformat(match['utcDate'].replace('Z', '+00:00')).replace(tzinfo=None),
+                'status': match.get('status')
+            })
+        if empty_expires_at is None:
+            expires_at = self._negative_expiry()
+            empty_expires_at = {date_key: expires_at for date_key in complete_dates}
+        self.db.store_matches(rows, complete_dates, empty_expires_at=empty_expires_at)
+        return {date_key: sum(1 for row in rows if row['local_date'] == date_key) for date_key in complete_dates}
+
+    def _negative_expiry(self) -> datetime:
+        return datetime.utcnow().replace(tzinfo=ZoneInfo("UTC")) + timedelta(seconds=config.MATCH_NEGATIVE_CACHE_TTL_SECONDS)
 
-    def _fetch_matches(self, target_date: datetime) -> dict:
-        """Fetch matches from API or cache for the given date"""
-        # Try loading from cache first
-        cached_data = self._load_cached_data(target_date)
-        if cached_data is not None:
-            logger.debug(f"Using cached data for {target_date.strftime('%Y-%m-%d')}")
-            return cached_data
+    def _prefetched_empty_expiry(self, date_key: str) -> datetime:
+        """Keep a prefetched empty day at least until that day's notification window closed,
+        so the morning run never goes back to the API for it"""
+        window_end = datetime.combine(
+            datetime.strptime(date_key, '%Y-%m-%d').date(),
+            datetime.min.time().replace(hour=config.NOTIFICATION_END_HOUR),
+            tzinfo=config.TIMEZONE_INFO
+        )
+        return max(self._negative_expiry(), window_end.astimezone(ZoneInfo("UTC")))
 
+    def _fetch_matches(self, target_date: datetime) -> bool:
+        """Make sure the matches of the given date are stored, asking the API if needed.
+        Concurrent callers, in this process or another, wait for a single API call and share its result.
+        Returns True if the date's matches are available."""
+        date_key = target_date.strftime('%Y-%m-%d')
+        if self.db.get_match_fetch_state(date_key) is not None:
+            return True
+
+        with _fetch_lock(date_key), _file_lock(self._lock_path()):
+            # Somebody else may have fetched while we were waiting for the locks
+            if self.db.get_match_fetch_state(date_key) is not None:
+                return True
+            return self._request_matches(target_date)
+
+    def _request_matches(self, target_date: datetime) -> bool:
+        date_key = target_date.strftime('%Y-%m-%d')
         # Prepare date range (yesterday to tomorrow to catch overnight matches)
         yesterday = (target_date - timedelta(days=1)).strftime('%Y-%m-%d')
         tomorrow = (target_date + timedelta(days=1)).strftime('%Y-%m-%d')
         
         # Get Italy area ID from config or use default
-        italy_area_id = self.teams_config.get('area_ids', {}).get('italy', 2114)
+        italy_area_id = self.team_index.area_ids.get('italy', 2114)
 
         try:
             # Prepare API request
-            url = f"{self.base_url}/matches"
             params = {
                 'dateFrom': yesterday,
                 'dateTo': tomorrow,
@@ -136,78 +393,149 @@ class MatchFetcher:
             }
             
             # Make the API request
-            logger.info(f"Fetching matches from API for {target_date.strftime('%Y-%m-%d')}")
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            data = response.json()
+            logger.info(f"Fetching matches from API for {date_key}")
+            data = self.api.get('/matches', params=params)
 
-            # Check if we got any matches
             if not data.get('matches'):
-                logger.warning(f"API returned no matches for {target_date.strftime('%Y-%m-%d')}")
-                return None
+                logger.warning(f"API returned no matches for {date_key}")
 
-            # Cache the successful response
-            self._save_to_cache(target_date, data)
-            return data
+            # Neighbouring days are only partially covered by the range: store their matches,
+            # but only mark the target date complete
+            self._store_matches(compact_matches(data)['matches'], [date_key])
+            return True
 
         except requests.exceptions.RequestException as e:
             logger.error(f"API request failed: {str(e)}")
-            return None
+            return False
         except Exception as e:
             logger.error(f"Unexpected error fetching matches: {str(e)}", exc_info=True)
-            return None
+            return False
 
-    def get_matches_for_city(self, city: str, target_date: datetime = None) -> list:
-        """Get matches for a specific city on the given date"""
+    def prefetch_range(self, start_date: datetime = None, days: int = None) -> dict:
+        """Fetch a window of days with a single API call and store every local day of it.
+        Returns {date: number of matches}, empty if the request failed."""
+        if start_date is None:
+            start_date = datetime.now(ZoneInfo('Europe/Rome'))
+        dates = [
+            (start_date + timedelta(days=offset)).strftime('%Y-%m-%d')
+            for offset in range(days or config.MATCH_PREFETCH_DAYS)
+        ]
+
+        # Pad by a day on each side: the API filters by UTC date, days are local
+        params = {
+            'dateFrom': (start_date - timedelta(days=1)).strftime('%Y-%m-%d'),
+            'dateTo': (start_date + timedelta(days=len(dates))).strftime('%Y-%m-%d'),
+            'areas': self.team_index.area_ids.get('italy', 2114)
+        }
+        with _fetch_lock('prefetch'), _file_lock(self._lock_path()):
+            try:
+                logger.info(f"Prefetching matches from {params['dateFrom']} to {params['dateTo']}")
+                data = self.api.get('/matches', params=params)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Match prefetch failed: {str(e)}")
+                return {}
+
+            # Days without matches are recorded too, so they don't go back to the API until they expire
+            return self._store_matches(
+                compact_matches(data)['matches'], dates, only_dates=dates,
+                empty_expires_at={date_key: self._prefetched_empty_expiry(date_key) for date_key in dates}
+            )
+
+    def _build_match_index(self, matches: list, target_date: datetime) -> MatchIndex:
+        """Localize and group the stored matches of the given date by city"""
+        matches_by_city = {}
+
+        for match in matches:
+            if not match.city:
+                continue
+            utc_time = match.utc_date.replace(tzinfo=ZoneInfo('UTC'))
+            rome_time = utc_time.astimezone(ZoneInfo('Europe/Rome'))
+            matches_by_city.setdefault(match.city, []).append({
+                'home': match.home,
+                'away': match.away,
+                'time_utc': utc_time.strftime('%H:%M'),
+                'time_local': rome_time.strftime('%H:%M'),
+                'status': match.status,
+                'date': match.local_date
+            })
+
+        return MatchIndex(target_date.date(), matches_by_city)
+
+    def get_match_index(self, target_date: datetime = None) -> MatchIndex:
+        """Get the city index for the given date, rebuilding it only when the stored matches changed"""
         if target_date is None:
             target_date = datetime.now(ZoneInfo('Europe/Rome'))
 
+        date_key = target_date.strftime('%Y-%m-%d')
+        # The fetch is single-flight on its own locks: keep the API call out of _index_lock
+        state = self.db.get_match_fetch_state(date_key)
+        if state is None:
+            self._fetch_matches(target_date)
+            state = self.db.get_match_fetch_state(date_key)
+        if state is None:
+            logger.warning(f"No match data available for {date_key}")
+            return MatchIndex(target_date.date(), {})
+
+        signature = (state.fetched_at, state.match_count)
+        with self._index_lock:
+            cached = self._match_indexes.get(date_key)
+            if cached and cached[0] == signature:
+                self._index_hits += 1
+                return cached[1]
+            self._index_misses += 1
+
+        index = self._build_match_index(self.db.get_matches_on(date_key), target_date)
+        with self._index_lock:
+            self._match_indexes.pop(date_key, None)
+            self._match_indexes[date_key] = (signature, index)
+            while len(self._match_indexes) > MAX_CACHED_INDEXES:
+                self._match_indexes.pop(next(iter(self._match_indexes)))
+
+        logger.info(f"Built match index for {date_key}: {len(index)} cities with matches")
+        return index
+
+    def get_matches_for_city(self, city: str, target_date: datetime = None) -> list:
+        """Get matches for a specific city on the given date"""
         normalized_city = self._normalize_city(city)
         if not normalized_city:
             logger.warning(f"Invalid city name provided: '{city}'")
             return []
 
-        data = self._fetch_matches(target_date)
-        if not data:
-            logger.warning(f"No match data available for {target_date.strftime('%Y-%m-%d')}")
+        index = self.get_match_index(target_date)
+        matches = list(index.matches_for(normalized_city))
+        logger.debug(f"Found {len(matches)} matches in {normalized_city}")
+        return matches
+
+    def get_upcoming_matches(self, city: str, days: int = 7, start_date: datetime = None) -> list:
+        """Stored matches in a city over the next days, as (date, home, away, local time) dicts"""
+        normalized_city = self._normalize_city(city)
+        if not normalized_city:
             return []
+        if start_date is None:
+            start_date = datetime.now(ZoneInfo('Europe/Rome'))
+        end_date = start_date + timedelta(days=days - 1)
+        return [
+            {
+                'date': match.local_date,
+                'home': match.home,
+                'away': match.away,
+                'time_local': match.utc_date.replace(tzinfo=ZoneInfo('UTC')).astimezone(ZoneInfo('Europe/Rome')).strftime('%H:%M'),
+                'status': match.status
+            }
+            for match in self.db.get_upcoming_matches(
+                normalized_city, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+            )
+        ]
 
-        matches_by_city = {}
-        logger.info(f"Looking for matches in {normalized_city} on {target_date.strftime('%Y-%m-%d')}")
-
-        for match in data.get('matches', []):
-
-            if match.get('competition', {}).get('code') == 'SA':
-
-                times = self._format_time(match.get('utcDate'))
-                
-                if not self._is_match_today(times['datetime'], target_date):
-                    continue
-
-                home_team = match.get('homeTeam', {})
-                away_team = match.get('awayTeam', {})
-                home_name = home_team.get('shortName')
-                
-                match_city = self._get_team_city(home_name)
-                
-                if match_city:
-                    match_info = {
-                        'home': home_name,
-                        'away': away_team.get('shortName', 'Unknown'),
-                        'time_utc': times['utc'],
-                        'time_local': times['local'],
-                        'status': match.get('status'),
-                        'date': times['datetime'].date().isoformat()
-                    }
-                    
-                    if match_city not in matches_by_city:
-                        matches_by_city[match_city] = []
-                    matches_by_city[match_city].append(match_info)
-                    logger.debug(f"Added match in {match_city}: {home_name} vs {away_team.get('shortName')}")
-
-        matches = matches_by_city.get(normalized_city, [])
-        logger.info(f"Found {len(matches)} matches in {normalized_city}")
-        return matches
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of this fetcher's in-memory match indexes"""
+        with self._index_lock:
+            return {
+                'hits': self._index_hits,
+                'misses': self._index_misses,
+                'entries': len(self._match_indexes),
+                'max_entries': MAX_CACHED_INDEXES
+            }
 
     def format_match_message(self, matches: list) -> str:
         """Format matches into a human-readable message"""
@@ -225,8 +553,4 @@ class MatchFetcher:
         """Check for matches in a city and return formatted message"""
         matches = self.get_matches_for_city(city)
 
-        message = self.format_match_message(matches)
-
-        self._cleanup_old_cache_files()
-        
-        return message
+        return self.format_match_message(matches)
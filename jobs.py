@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from telegram.constants import ChatAction
+from telegram.error import RetryAfter
+from storage import Database
+from custom_bot import classify_send_error, UNREACHABLE_CHAT_ERRORS
+from fetcher import MatchFetcher
+from notifier import fan_out_notifications
+from sender import rate_limiter, retry_after_seconds
+from wakeup import QueueWakeup, JOBS_SOCKET_PATH
+import config
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_ALL = 'notify_all'
+CLEANUP_USERS = 'cleanup_users'
+MAINTENANCE = 'maintenance'
+
+# Operations older versions queued as ADMIN_OPERATION rows in the message queue
+LEGACY_ADMIN_OPERATIONS = {'CLEANUP_USERS': CLEANUP_USERS}
+
+# kind -> coroutine function taking a JobContext and returning the job result
+_handlers = {}
+
+def job_handler(kind: str):
+    """Register the coroutine that runs jobs of the given kind"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+class JobContext:
+    """What a running job can use: the database, the bot and a throttled progress reporter"""
+
+    def __init__(self, db: Database, bot, job: dict):
+        self.db = db
+        self.bot = bot
+        self.job = job
+        self.progress = dict(job['progress'])
+        self._reported_at = 0.0
+
+    def report(self, progress: dict = None, force: bool = False):
+        """Merge `progress` into the job's progress and store it at most every JOB_PROGRESS_INTERVAL_SECONDS"""
+        if progress:
+            self.progress.update(progress)
+        now = time.monotonic()
+        if not force and now - self._reported_at < config.JOB_PROGRESS_INTERVAL_SECONDS:
+            return
+        self._reported_at = now
+        try:
+            self.db.update_job_progress(self.job['id'], self.progress)
+        except Exception as e:
+            logger.warning(f"Could not store progress of job {self.job['id']}: {str(e)}")
+
+@job_handler(NOTIFY_ALL)
+async def run_notify_all(context: JobContext) -> dict:
+    """Queue today's match notifications for every user"""
+    fetcher = MatchFetcher(context.db)
+    users = context.db.get_active_users()
+    current_utc = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC"))
+    context.report({'users_total': len(users), 'users_processed': 0, 'messages_queued': 0}, force=True)
+
+    def on_progress(processed: int, stats: dict):
+        context.report({'users_processed': processed, 'messages_queued': stats['notifications_sent']})
+
+    # Fan-out is blocking database work, keep it off the executor's event loop
+    stats = await asyncio.to_thread(
+        fan_out_notifications,
+        context.db, fetcher, users,
+        today=current_utc.date(),
+        tz=ZoneInfo("UTC"),
+        progress=on_progress
+    )
+    context.report({'users_processed': len(users), 'messages_queued': stats['notifications_sent']})
+    return {key: value for key, value in stats.items() if key != 'cities'}
+
+# Errors kept in a cleanup job's result; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+async def _probe_user(telegram_bot, telegram_id: int, semaphore: asyncio.Semaphore) -> tuple:
+    """Check whether a user blocked the bot with a chat action, the cheapest call that reaches the chat.
+    Returns (blocked, error)."""
+    async with semaphore:
+        while True:
+            await rate_limiter.acquire(telegram_id)
+            try:
+                await telegram_bot.send_chat_action(chat_id=telegram_id, action=ChatAction.TYPING)
+                return False, None
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                logger.warning(f"Flood control hit probing user {telegram_id}, pausing for {delay}s")
+                rate_limiter.pause(delay)
+            except Exception as e:
+                if classify_send_error(e) in UNREACHABLE_CHAT_ERRORS:
+                    return True, None
+                return False, str(e)
+
+@job_handler(CLEANUP_USERS)
+async def run_cleanup_users(context: JobContext) -> dict:
+    """Remove users who blocked the bot or deleted their account.
+    Users are probed a page at a time in telegram_id order; after each page the removals are committed
+    and the last id is checkpointed, so a restarted job resumes where it stopped."""
+    progress = context.progress
+    progress.setdefault('users_checked', 0)
+    progress.setdefault('users_removed', 0)
+    progress.setdefault('errors', 0)
+    errors = progress.setdefault('recent_errors', [])
+    if progress.get('cursor') is not None:
+        logger.info(f"Resuming cleanup after user {progress['cursor']}")
+    context.report(force=True)
+
+    semaphore = asyncio.Semaphore(config.CLEANUP_CONCURRENCY)
+    # A client of our own: the polling loop's client can't be used from this event loop
+    async with context.bot.create_sender_bot(config.CLEANUP_CONCURRENCY) as telegram_bot:
+        while True:
+            user_ids = context.db.get_user_ids_after(progress.get('cursor'), limit=config.CLEANUP_PAGE_SIZE)
+            if not user_ids:
+                break
+
+            results = await asyncio.gather(
+                *(_probe_user(telegram_bot, user_id, semaphore) for user_id in user_ids)
+            )
+            blocked_ids = [user_id for user_id, (blocked, _) in zip(user_ids, results) if blocked]
+            for user_id, (_, error) in zip(user_ids, results):
+                if error:
+                    logger.warning(f"Error checking user {user_id}: {error}")
+                    progress['errors'] += 1
+                    errors.append(f"User {user_id}: {error}")
+            del errors[:-MAX_REPORTED_ERRORS]
+
+            if blocked_ids:
+                context.db.delete_users(blocked_ids)
+                logger.info(f"Removed {len(blocked_ids)} users who blocked the bot")
+            progress['users_checked'] += len(user_ids)
+            progress['users_removed'] += len(blocked_ids)
+            progress['cursor'] = user_ids[-1]
+            context.report(force=True)
+
+    logger.info(
+        f"Cleanup results: Removed {progress['users_removed']} of {progress['users_checked']} users, "
+        f"{progress['errors']} errors"
+    )
+    return {
+        'total_users': progress['users_checked'],
+        'removed_users': progress['users_removed'],
+        'error_count': progress['errors'],
+        'errors': list(errors)
+    }
+
+def _maintain(db: Database, report) -> dict:
+    """Housekeeping kept off the notification path, one step after the other"""
+    fetcher = MatchFetcher(db)
+    result = {}
+
+    report({'step': 'matches'})
+    result['legacy_files_imported'] = fetcher.import_legacy_cache_files()
+    result['matches_pruned'] = fetcher.prune_old_matches()
+
+    report({'step': 'messages'})
+    now = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC"))
+    archived = db.archive_messages(
+        sent_before=now - timedelta(days=config.QUEUE_SENT_RETENTION_DAYS),
+        dead_letter_before=now - timedelta(days=config.QUEUE_DEAD_LETTER_RETENTION_DAYS),
+        batch_size=config.QUEUE_ARCHIVE_BATCH_SIZE
+    )
+    result['sent_messages_archived'] = archived['sent']
+    result['dead_letters_archived'] = archived['dead_letter']
+
+    report({'step': 'database'})
+    result.update(db.optimize_database(config.MAINTENANCE_VACUUM_FREE_RATIO))
+    return result
+
+@job_handler(MAINTENANCE)
+async def run_maintenance(context: JobContext) -> dict:
+    """Prune old matches, archive old messages into daily statistics, then refresh statistics, checkpoint and compact the database"""
+    started = time.monotonic()
+    result = await asyncio.to_thread(_maintain, context.db, lambda progress: context.report(progress, force=True))
+    context.report({'step': 'done'}, force=True)
+    result['seconds'] = round(time.monotonic() - started, 3)
+    logger.info(f"Maintenance results: {result}")
+    return result
+
+class JobExecutor:
+    """Runs queued admin jobs in a dedicated thread of the bot process.
+    Every job kind has its own lane, so an hours-long cleanup doesn't hold up notifications or maintenance;
+    jobs of the same kind still run one at a time."""
+
+    def __init__(self, bot=None):
+        self.bot = bot
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._thread = None
+        self._wakeup = QueueWakeup(JOBS_SOCKET_PATH)
+
+    def recover(self):
+        """Requeue jobs a restart interrupted and move legacy admin operations out of the message queue.
+        Must run before the QueueSender starts, or it would send the legacy rows to chat 0."""
+        db = Database()
+        requeued = db.requeue_running_jobs()
+        if requeued:
+            logger.info(f"Requeued {requeued} jobs interrupted by a restart")
+        migrated = db.migrate_legacy_admin_operations(LEGACY_ADMIN_OPERATIONS)
+        if migrated:
+            logger.info(f"Moved {migrated} legacy admin operations from the message queue to jobs")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='job-executor', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._serve())
+        finally:
+            loop.close()
+
+    async def _serve(self):
+        db = Database()
+        self._wakeup.open()
+        kinds = sorted(_handlers)
+        logger.info(f"Starting job executor ({', '.join(kinds)})")
+        # One lane per registered kind, plus one that fails jobs nobody can run
+        await asyncio.gather(
+            *(self._lane(db, kind, kinds=[kind]) for kind in kinds),
+            self._lane(db, 'unknown', exclude_kinds=kinds)
+        )
+
+    async def _lane(self, db: Database, name: str, kinds: list = None, exclude_kinds: list = None):
+        while True:
+            try:
+                job = db.claim_next_job(self.worker_id, kinds=kinds, exclude_kinds=exclude_kinds)
+                if job is None:
+                    await self._wakeup.wait(config.JOB_POLL_INTERVAL_SECONDS)
+                    continue
+                await self._run_job(db, job)
+            except Exception as e:
+                logger.error(f"Error in {name} job lane: {str(e)}")
+                await asyncio.sleep(5)  # Back off on error
+
+    async def _run_job(self, db: Database, job: dict):
+        handler = _handlers.get(job['kind'])
+        if handler is None:
+            logger.error(f"No handler for {job['kind']} job {job['id']}")
+            db.finish_job(job['id'], error=f"Unknown job kind: {job['kind']}")
+            return
+
+        context = JobContext(db, self.bot, job)
+        started = time.monotonic()
+        logger.info(f"Running {job['kind']} job {job['id']}")
+        try:
+            result = await handler(context)
+        except Exception as e:
+            logger.error(f"{job['kind']} job {job['id']} failed: {str(e)}", exc_info=True)
+            db.finish_job(job['id'], error=traceback.format_exc(), progress=context.progress)
+            return
+        db.finish_job(job['id'], result=result, progress=context.progress)
+        logger.info(f"{job['kind']} job {job['id']} finished in {time.monotonic() - started:.2f}s")
@@ -0,0 +1,79 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime, tzinfo
+from fetcher import normalize_name
+
+logger = logging.getLogger(__name__)
+
+def group_users_by_city(users) -> dict:
+    """Group users by their normalized city, dropping users without a valid city"""
+    users_by_city = defaultdict(list)
+    for user in users:
+        city = normalize_name(user.city)
+        if city:
+            users_by_city[city].append(user)
+    return users_by_city
+
+def _notified_on(user, day: date, tz: tzinfo) -> bool:
+    """Check if the user already got a notification on the given day"""
+    if not user.last_notification:
+        return False
+    last_notif = user.last_notification
+    if last_notif.tzinfo is None:
+        last_notif = last_notif.replace(tzinfo=tz)
+    return last_notif.date() == day
+
+def fan_out_notifications(db, fetcher, users, today: date, tz: tzinfo, target_date: datetime = None,
+                          progress=None) -> dict:
+    """Render each city's match message once and queue it for every user of that city.
+    `progress`, if given, is called after each city with the users processed so far and the stats."""
+    index = fetcher.get_match_index(target_date)
+    users_by_city = group_users_by_city(users)
+    processed = len(users) - sum(len(city_users) for city_users in users_by_city.values())
+
+    stats = {
+        'notifications_sent': 0,
+        'no_matches': processed,
+        'already_notified': 0,
+        'failed': 0,
+        'cities': []
+    }
+
+    for city, city_users in users_by_city.items():
+        processed += len(city_users)
+        matches = index.matches_for(city)
+        if not matches:
+            stats['no_matches'] += len(city_users)
+            if progress:
+                progress(processed, stats)
+            continue
+
+        started = time.perf_counter()
+        city_stats = {'city': city, 'users': len(city_users), 'recipients': 0, 'queued': 0}
+        try:
+            message = fetcher.format_match_message(matches)
+            recipients = [user for user in city_users if not _notified_on(user, today, tz)]
+            stats['already_notified'] += len(city_users) - len(recipients)
+            city_stats['recipients'] = len(recipients)
+
+            if recipients:
+                city_stats['queued'] = db.queue_notifications(
+                    [(user.telegram_id, message) for user in recipients], city=city
+                )
+                stats['failed'] += len(recipients) - city_stats['queued']
+        except Exception as e:
+            logger.error(f"Error notifying users in {city}: {str(e)}", exc_info=True)
+            stats['failed'] += city_stats['recipients'] - city_stats['queued']
+
+        city_stats['seconds'] = time.perf_counter() - started
+        stats['notifications_sent'] += city_stats['queued']
+        stats['cities'].append(city_stats)
+        logger.info(
+            f"Queued {city_stats['queued']}/{city_stats['recipients']} notifications for {city} "
+            f"in {city_stats['seconds']:.3f}s"
+        )
+        if progress:
+            progress(processed, stats)
+
+    return stats
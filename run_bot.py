@@ -10,11 +10,11 @@ import os
 import requests
 import time
 import sys
-import asyncio
 from bot import run_bot
 from scheduler import create_scheduler
 from bot_manager import get_bot
-from storage import Database
+from sender import QueueSender
+from jobs import JobExecutor
 import config
 
 # Configure logging
@@ -70,74 +70,16 @@ if __name__ == "__main__":
     scheduler = create_scheduler()
     scheduler.start()
     
-    # Start a thread to process queued messages
-    import threading
+    # Recover admin jobs first: legacy ones still sit in the message queue the sender drains
+    job_executor = JobExecutor(bot_instance)
+    job_executor.recover()
     
-    async def process_admin_operation(operation, message_id, db):
-        """Process admin operations that require async functions"""
-        if operation == "CLEANUP_USERS":
-            # Handle user cleanup operation
-            logger.info("Running user cleanup operation")
-            try:
-                results = await db.remove_blocked_users(bot_instance)
-                logger.info(f"Cleanup results: Removed {results['removed_users']} of {results['total_users']} users")
-                if results['errors']:
-                    logger.warning(f"Cleanup errors: {', '.join(results['errors'])}")
-            except Exception as admin_error:
-                logger.error(f"Error during admin operation: {str(admin_error)}")
-            
-            # Mark the admin message as processed
-            db.mark_message_sent(message_id)
+    # Start the sender that drains queued messages
+    queue_sender = QueueSender(bot_instance)
+    queue_sender.start()
     
-    def process_message_queue():
-        db = Database()
-        logger.info("Starting message queue processing thread")
-        
-        while True:
-            try:
-                messages = db.get_pending_messages(limit=10)
-                for message in messages:
-                    try:
-                        # Check if this is an admin operation
-                        if message.telegram_id == 0 and message.message.startswith("ADMIN_OPERATION:"):
-                            admin_op = message.message.replace("ADMIN_OPERATION:", "").strip()
-                            logger.info(f"Processing admin operation: {admin_op}")
-                            
-                            # Run async operations in the event loop
-                            loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(loop)
-                            try:
-                                loop.run_until_complete(process_admin_operation(admin_op, message.id, db))
-                            finally:
-                                loop.close()
-                            
-                        # Regular message to be sent to a user
-                        else:
-                            logger.info(f"Processing queued message {message.id} for user {message.telegram_id}")
-                            success = bot_instance.send_message_sync(
-                                chat_id=message.telegram_id,
-                                text=message.message
-                            )
-                            if success:
-                                db.mark_message_sent(message.id)
-                                logger.info(f"Successfully sent message {message.id} to user {message.telegram_id}")
-                            else:
-                                logger.warning(f"Failed to send message {message.id} to user {message.telegram_id}")
-                    except Exception as e:
-                        logger.error(f"Error processing message {message.id}: {str(e)}")
-                
-                # Sleep for a short time if no messages
-                if not messages:
-                    time.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Error in message queue processing: {str(e)}")
-                time.sleep(5)  # Back off on error
-    
-    # Start the message queue processor thread
-    queue_thread = threading.Thread(target=process_message_queue)
-    queue_thread.daemon = True
-    queue_thread.start()
+    # Start the executor for long-running admin jobs
+    job_executor.start()
     
     # Start the bot polling
     logger.info("Starting bot polling")
@@ -2,6 +2,8 @@ from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
 from storage import Database
 from fetcher import MatchFetcher
+from notifier import fan_out_notifications
+from jobs import MAINTENANCE
 from bot_manager import get_bot
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import config
@@ -16,7 +18,7 @@ TIMEZONE = config.TIMEZONE_INFO
 
 def create_scheduler():
     db = Database()
-    fetcher = MatchFetcher()
+    fetcher = MatchFetcher(db)
     bot = get_bot(config.TELEGRAM_BOT_TOKEN)
     scheduler = BackgroundScheduler(
         timezone="UTC",
@@ -55,53 +57,38 @@ def create_scheduler():
             print("Notifications already sent today")
             return
             
-        users = db.get_all_users()
-        notifications_sent = 0
-        no_matches = 0
-        already_notified = 0
-        
-        for user in users:
-            try:
-                if user.last_notification:
-                    last_notif = user.last_notification
-                    if last_notif.tzinfo is None:
-                        last_notif = last_notif.replace(tzinfo=TIMEZONE)
-                    if last_notif.date() == local_time.date():
-                        already_notified += 1
-                        print(f"Notification already sent today for user {user.telegram_id}")
-                        continue
-                
-                print(f"Checking matches for user {user.telegram_id} in {user.city}...")
-                try:
-                    message = fetcher.check_matches_for_city(user.city)
-                    if message:
-                        try:
-                            # Queue the message instead of sending it directly
-                            if db.queue_message(
-                                telegram_id=user.telegram_id,
-                                message=message
-                            ):
-                                db.update_last_notification(user.telegram_id)
-                                notifications_sent += 1
-                                print(f"Notification queued for user {user.telegram_id}")
-                            else:
-                                print(f"Failed to queue notification for user {user.telegram_id}")
-                        except Exception as send_error:
-                            print(f"Error queueing message for user {user.telegram_id}: {str(send_error)}")
-                    else:
-                        no_matches += 1
-                        print(f"No match found for user {user.telegram_id} in {user.city}")
-                except Exception as fetch_error:
-                    print(f"Error fetching matches for user {user.telegram_id}: {str(fetch_error)}")
-                    
-            except Exception as e:
-                print(f"Error processing user {user.telegram_id}: {str(e)}")
-                logger.error(f"Scheduler error for user {user.telegram_id}: {str(e)}", exc_info=True)
+        users = db.get_active_users()
+        stats = fan_out_notifications(db, fetcher, users, today=local_time.date(), tz=TIMEZONE)
+        notifications_sent = stats['notifications_sent']
+        no_matches = stats['no_matches']
+        already_notified = stats['already_notified']
+
+        for city_stats in stats['cities']:
+            print(
+                f"City {city_stats['city']}: {city_stats['queued']}/{city_stats['recipients']} notifications queued "
+                f"({city_stats['users']} users) in {city_stats['seconds']:.3f}s"
+            )
+        if stats['failed']:
+            print(f"Failed to queue {stats['failed']} notifications")
         
         if notifications_sent > 0 or no_matches > 0:
             db.update_scheduler_last_run()
             print(f"Job complete. Notifications sent: {notifications_sent}, No matches: {no_matches}, Already notified: {already_notified}")
+            print(f"Match index stats: {fetcher.cache_stats()}")
     
+    def prefetch_matches():
+        """Store the matches of the coming days before the notification window opens"""
+        counts = fetcher.prefetch_range()
+        if counts:
+            print(f"Prefetched matches for {len(counts)} days: " + ", ".join(f"{day}={count}" for day, count in counts.items()))
+        else:
+            print("Match prefetch failed, matches will be fetched on demand")
+
+    def queue_maintenance():
+        """Hand the nightly housekeeping to the job executor, so its results show up in the admin"""
+        job_id = db.create_job(MAINTENANCE)
+        print(f"Queued maintenance job #{job_id}")
+
     def dynamic_schedule():
         """Run notifications and schedule next check"""
         check_and_send_notifications()
@@ -117,6 +104,27 @@ def create_scheduler():
         print(f"Next check scheduled in {next_interval/3600:.1f} hours")
 
     scheduler.add_job(dynamic_schedule, 'date', run_date=datetime.utcnow(), id='morning_notifications')
+
+    prefetch_at = datetime.combine(datetime.utcnow().date(), datetime.min.time().replace(hour=config.NOTIFICATION_START_HOUR)) \
+        - timedelta(minutes=config.MATCH_PREFETCH_LEAD_MINUTES)
+    scheduler.add_job(
+        prefetch_matches,
+        'cron',
+        hour=prefetch_at.hour,
+        minute=prefetch_at.minute,
+        timezone=TIMEZONE,
+        id='match_prefetch',
+        replace_existing=True
+    )
+
+    scheduler.add_job(
+        queue_maintenance,
+        'cron',
+        hour=config.MAINTENANCE_HOUR,
+        timezone=TIMEZONE,
+        id='maintenance',
+        replace_existing=True
+    )
     
     class MatchScheduler:
         def start(self):
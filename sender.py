@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from telegram.error import RetryAfter
+from storage import Database
+from wakeup import QueueWakeup
+from custom_bot import UNREACHABLE_CHAT_ERRORS
+import config
+
+logger = logging.getLogger(__name__)
+
+# Per-chat buckets idle for longer than this are dropped
+CHAT_BUCKET_IDLE_SECONDS = 60
+MAX_CHAT_BUCKETS = 10000
+
+class TokenBucket:
+    """Token bucket rate limiter that can be shared across threads and event loops"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        # Tokens refill from this time on; it lies in the future while paused
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def _reserve(self) -> float:
+        """Take a token and return how long the caller has to wait before using it.
+        Callers queue up behind each other, also behind a pause, so they never all go at once."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(self._updated - now, 0.0) + wait
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given number of seconds, then restart without a burst"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            resume_at = now + seconds
+            if resume_at > self._updated:
+                self._tokens = min(self._tokens, 1.0)
+                self._updated = resume_at
+
+    def idle_since(self) -> float:
+        return self._updated
+
+class TelegramRateLimiter:
+    """Global and per-chat rate limits for the Telegram Bot API"""
+
+    def __init__(self, global_rate: float, per_chat_rate: float):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self._chat_buckets = {}
+        self._lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                    cutoff = time.monotonic() - CHAT_BUCKET_IDLE_SECONDS
+                    self._chat_buckets = {
+                        key: value for key, value in self._chat_buckets.items()
+                        if value.idle_since() > cutoff
+                    }
+                bucket = TokenBucket(self.per_chat_rate, capacity=1)
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    async def acquire(self, chat_id: int):
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    def pause(self, seconds: float):
+        self.global_bucket.pause(seconds)
+
+# Shared by everything in the process that talks to Telegram
+rate_limiter = TelegramRateLimiter(config.TELEGRAM_GLOBAL_RATE, config.TELEGRAM_PER_CHAT_RATE)
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+class QueueSender:
+    """Long-lived sender draining the message queue with a bounded number of sends in flight.
+    Each worker leases its own batch, so several workers and processes can drain the queue together."""
+
+    def __init__(self, bot, workers: int = None, max_in_flight: int = None,
+                 batch_size: int = None, limiter: TelegramRateLimiter = None):
+        self.bot = bot
+        self.workers = workers or config.SENDER_WORKERS
+        self.max_in_flight = max_in_flight or config.SENDER_MAX_IN_FLIGHT
+        self.batch_size = batch_size or config.SENDER_BATCH_SIZE
+        self.limiter = limiter or rate_limiter
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.sent = 0
+        self.failed = 0
+        self.last_rate = 0.0
+        self._busy_workers = set()
+        self._burst_started = None
+        self._burst_sent = 0
+        self._thread = None
+        self._wakeup = QueueWakeup()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='queue-sender', daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'last_rate': self.last_rate
+        }
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._serve())
+        finally:
+            loop.close()
+
+    async def _serve(self):
+        db = Database()
+        logger.info(
+            f"Starting queue sender ({self.workers} workers, max in flight per worker: {self.max_in_flight}, "
+            f"batch size: {self.batch_size})"
+        )
+
+        self._wakeup.open()
+        while True:
+            try:
+                # A dedicated Telegram client so sends don't share connections with the polling loop
+                async with self.bot.create_sender_bot(self.max_in_flight * self.workers) as sender_bot:
+                    await asyncio.gather(*(
+                        self._worker(db, sender_bot, f"{self.worker_prefix}:{i}") for i in range(self.workers)
+                    ))
+            except Exception as e:
+                logger.error(f"Error in message queue processing: {str(e)}")
+                await asyncio.sleep(5)  # Back off on error
+
+    async def _worker(self, db, sender_bot, worker_id: str):
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        while True:
+            try:
+                messages = db.claim_messages(worker_id, limit=self.batch_size)
+                if not messages:
+                    self._busy_workers.discard(worker_id)
+                    if not self._busy_workers:
+                        self._finish_burst()
+                    # Producers signal new messages; polling only catches retries and missed signals
+                    await self._wakeup.wait(config.QUEUE_POLL_INTERVAL_SECONDS)
+                    continue
+                self._busy_workers.add(worker_id)
+                await self._process_batch(db, sender_bot, messages, semaphore)
+            except Exception as e:
+                logger.error(f"Error in queue worker {worker_id}: {str(e)}")
+                await asyncio.sleep(5)  # Back off on error
+
+    async def _process_batch(self, db, sender_bot, user_messages: list, semaphore: asyncio.Semaphore):
+        lease_owner = user_messages[0].lease_owner
+        if self._burst_started is None:
+            self._burst_started = time.monotonic()
+
+        started = time.monotonic()
+        # The whole batch stays leased until it is acked; ids taken over by another worker go in `lost`
+        lost = set()
+        renew = asyncio.Event()
+        done = asyncio.Event()
+        renewer = asyncio.create_task(
+            self._renew_leases(db, lease_owner, [message.id for message in user_messages], lost, renew, done)
+        )
+        try:
+            results = await asyncio.gather(
+                *(self._send_one(sender_bot, message, semaphore, lost, renew) for message in user_messages)
+            )
+        finally:
+            done.set()
+            renew.set()
+            await renewer
+        sent_ids = [message.id for message, (success, _, _) in zip(user_messages, results) if success]
+        failures = {
+            message.id: error for message, (success, error, _) in zip(user_messages, results)
+            if not success and message.id not in lost
+        }
+        # Blocked or deleted chats will never accept the message: drop it and stop notifying the user
+        unreachable = {
+            message.telegram_id: category for message, (_, _, category) in zip(user_messages, results)
+            if category in UNREACHABLE_CHAT_ERRORS
+        }
+        permanent = {message.id for message in user_messages if message.telegram_id in unreachable}
+        db.ack_messages(sent_ids, lease_owner)
+        if failures:
+            dead_lettered = db.nack_messages(failures, lease_owner, permanent=permanent)
+            logger.warning(f"{len(failures)} messages failed, {dead_lettered} moved to dead letter")
+        if unreachable:
+            db.deactivate_users(unreachable)
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.sent += len(sent_ids)
+        self.failed += len(user_messages) - len(sent_ids)
+        self._burst_sent += len(sent_ids)
+        self.last_rate = len(sent_ids) / elapsed
+        logger.info(
+            f"Sent {len(sent_ids)}/{len(user_messages)} queued messages in {elapsed:.2f}s "
+            f"({self.last_rate:.1f} msg/s)"
+        )
+
+    async def _renew_leases(self, db, lease_owner: str, message_ids: list, lost: set,
+                            renew: asyncio.Event, done: asyncio.Event):
+        """Keep the batch's lease alive until `done`: every third of the lease time,
+        and right after a flood-control pause"""
+        while True:
+            try:
+                await asyncio.wait_for(renew.wait(), config.QUEUE_LEASE_SECONDS / 3)
+            except asyncio.TimeoutError:
+                pass
+            if done.is_set():
+                return
+            renew.clear()
+            expired = set(message_ids) - lost - db.extend_lease(message_ids, lease_owner)
+            if expired:
+                lost.update(expired)
+                logger.warning(f"Lease lost on {len(expired)} messages, leaving them to the worker that took them")
+
+    async def _send_one(self, sender_bot, message, semaphore: asyncio.Semaphore,
+                        lost: set, renew: asyncio.Event) -> tuple:
+        async with semaphore:
+            return await self._deliver(sender_bot, message, lost, renew)
+
+    async def _deliver(self, sender_bot, message, lost: set, renew: asyncio.Event) -> tuple:
+        paused = False
+        while True:
+            await self.limiter.acquire(message.telegram_id)
+            if paused:
+                # The flood-control pause may have eaten most of the lease
+                renew.set()
+                paused = False
+            if message.id in lost:
+                return False, 'Lease lost', None
+            try:
+                success, error, category = await self.bot._send_message_async(
+                    chat_id=message.telegram_id,
+                    text=message.message,
+                    bot=sender_bot
+                )
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                logger.warning(f"Flood control hit sending message {message.id}, pausing for {delay}s")
+                self.limiter.pause(delay)
+                paused = True
+                continue
+
+            if not success:
+                logger.warning(f"Failed to send message {message.id} to user {message.telegram_id}: {error}")
+            return success, error, category
+
+    def _finish_burst(self):
+        """Log the throughput of the burst that just drained the queue"""
+        if self._burst_started is None:
+            return
+        elapsed = max(time.monotonic() - self._burst_started, 1e-6)
+        logger.info(
+            f"Queue drained: {self._burst_sent} messages in {elapsed:.2f}s "
+            f"({self._burst_sent / elapsed:.1f} msg/s)"
+        )
+        self._burst_started = None
+        self._burst_sent = 0
@@ -1,18 +1,126 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, func, inspect, text
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, DateTime, Index, UniqueConstraint, func, inspect, text, insert, update, delete, select, and_, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timedelta
 import os
 import asyncio
 import logging
+import base64
 import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from zoneinfo import ZoneInfo
+import config
+from wakeup import notify_queue, JOBS_SOCKET_PATH
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows: the lock then only holds within a process
+    fcntl = None
 
 Base = declarative_base()
 
+# Lightweight read-only view of a user for the admin list
+UserRow = namedtuple('UserRow', [
+    'telegram_id', 'username', 'city', 'last_notification', 'last_notification_display', 'has_access', 'is_active'
+])
+
+USER_SORTS = ('id', 'last_notification')
+
+# Keep IN (...) lists well below SQLite's bound parameter limit
+BULK_CHUNK_SIZE = 500
+
+def _chunked(items: list, size: int = BULK_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock shared with other processes (the bot and admin containers share ./data)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply the SQLite tuning profile to every new connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets the bot and admin containers read while the other one writes
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+def create_sqlite_engine(db_path: str):
+    """Create an engine for the SQLite file with the tuning profile applied"""
+    engine = create_engine(
+        f'sqlite:///{db_path}',
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        connect_args={
+            'timeout': config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            # Pooled connections are handed to whichever thread needs one
+            'check_same_thread': False
+        }
+    )
+    event.listen(engine, 'connect', _configure_sqlite_connection)
+    return engine
+
+# One engine (and connection pool) per database file, shared by every Database in the process
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(db_path: str):
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            engine = create_sqlite_engine(db_path)
+            _engines[db_path] = engine
+        return engine
+
+# One consistent view of the access lists; replaced as a whole, never modified
+AccessSnapshot = namedtuple('AccessSnapshot', ['version', 'mode', 'listed', 'checked_at'])
+
+class AccessCache:
+    """Access mode and the ids listed for it, shared by every Database of a process.
+    The access_mode version counter tells when another process changed the lists.
+    Readers take `snapshot` once, so they never pair the mode of one version with the list of another."""
+
+    def __init__(self):
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        with self.lock:
+            self.snapshot = None
+
+_access_caches = {}
+
+def get_access_cache(db_path: str) -> AccessCache:
+    with _engines_lock:
+        return _access_caches.setdefault(db_path, AccessCache())
+
 # Table to store pending messages for the bot to send
 class MessageQueue(Base):
     __tablename__ = 'message_queue'
+    __table_args__ = (
+        # Serves the pending/claim poll: equality on the flags, then created_at order
+        Index('ix_message_queue_pending', 'sent', 'dead_letter', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     telegram_id = Column(Integer, nullable=False)
@@ -20,6 +128,25 @@ class MessageQueue(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     sent = Column(Boolean, default=False)
     sent_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    dead_letter = Column(Boolean, nullable=False, default=False)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    # Normalized city of the notification, kept for the daily statistics
+    city = Column(String, nullable=True)
+
+class MessageDailyStat(Base):
+    """Messages archived out of the queue, counted per local day, city and outcome ('sent' or 'dead_letter')"""
+    __tablename__ = 'message_daily_stats'
+
+    day = Column(String, primary_key=True)
+    # Empty for messages queued without a city
+    city = Column(String, primary_key=True)
+    outcome = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
 
 class User(Base):
     __tablename__ = 'users'
@@ -32,9 +159,22 @@ class User(Base):
     is_blocked = Column(Boolean, default=False)
     last_notification = Column(DateTime, nullable=True)
     last_manual_notification = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Cleared when delivery shows the chat is gone (user blocked the bot or deleted the account)
+    is_active = Column(Boolean, nullable=False, default=True)
+    deactivated_at = Column(DateTime, nullable=True)
+    deactivation_reason = Column(String, nullable=True)
+
+# Indexes behind the admin user list: sort by last notification and case-insensitive prefix search
+Index('ix_users_last_notification', User.last_notification, User.telegram_id)
+Index('ix_users_username_nocase', User.username.collate('NOCASE'))
+Index('ix_users_city_nocase', User.city.collate('NOCASE'))
 
 class AccessControl(Base):
     __tablename__ = 'access_control'
+    __table_args__ = (
+        Index('ix_access_control_mode_telegram_id', 'mode', 'telegram_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     mode = Column(String, nullable=False)
@@ -47,6 +187,8 @@ class AccessMode(Base):
     id = Column(Integer, primary_key=True)
     mode = Column(String, nullable=False, default='blocklist')
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every access mode or list change so other processes can refresh their cache
+    version = Column(Integer, nullable=False, default=0)
 
 class SchedulerState(Base):
     __tablename__ = 'scheduler_state'
@@ -55,20 +197,85 @@ class SchedulerState(Base):
     last_run = Column(DateTime, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class AdminJob(Base):
+    """Long-running admin operations, executed by the bot process outside the request path"""
+    __tablename__ = 'admin_jobs'
+    __table_args__ = (
+        Index('ix_admin_jobs_status_created_at', 'status', 'created_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='queued')
+    params = Column(String, nullable=True)
+    progress = Column(String, nullable=True)
+    result = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    worker = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+class Match(Base):
+    """Serie A matches by local (Europe/Rome) day, with the normalized city of the home team"""
+    __tablename__ = 'matches'
+    __table_args__ = (
+        # A team plays at home at most once a day; also serves whole-day lookups
+        UniqueConstraint('local_date', 'home', name='uq_matches_local_date_home'),
+        # Matches in a city on a day or over a range of days
+        Index('ix_matches_city_local_date', 'city', 'local_date'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    local_date = Column(String, nullable=False)
+    city = Column(String, nullable=True)
+    home = Column(String, nullable=False)
+    away = Column(String, nullable=False)
+    utc_date = Column(DateTime, nullable=False)
+    status = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MatchFetchState(Base):
+    """Days whose matches are stored completely; empty API answers expire so they are asked again"""
+    __tablename__ = 'match_fetch_state'
+
+    local_date = Column(String, primary_key=True)
+    fetched_at = Column(DateTime, nullable=False)
+    match_count = Column(Integer, nullable=False, default=0)
+    expires_at = Column(DateTime, nullable=True)
+
 class Database:
+    """Database access for the bot, admin and scheduler.
+    Every method runs in its own short-lived session, so one instance can be shared between threads."""
+
+    _schema_ready = set()
+    _schema_lock = threading.Lock()
+
     def __init__(self):
         db_path = os.path.join('data', 'bot.sqlite3')
         os.makedirs('data', exist_ok=True)
-        self.engine = create_engine(f'sqlite:///{db_path}')
+        self.engine = get_engine(db_path)
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        self.access_cache = get_access_cache(db_path)
+
+        with Database._schema_lock:
+            if db_path not in Database._schema_ready:
+                # The bot and admin containers start together: only one of them may migrate at a time
+                with file_lock(os.path.join('data', 'schema.lock')):
+                    self._setup_schema()
+                Database._schema_ready.add(db_path)
+
+    def _setup_schema(self):
         Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
         self._upgrade_schema()
-
-        if not self.session.query(AccessMode).first():
-            default_mode = AccessMode(mode='blocklist')
-            self.session.add(default_mode)
-            self.session.commit()
+        with self.Session.begin() as session:
+            if not session.query(AccessMode).first():
+                session.add(AccessMode(mode='blocklist'))
+            if not session.get(SchedulerState, 1):
+                session.add(SchedulerState(id=1))
 
     def _upgrade_schema(self):
         inspector = inspect(self.engine)
@@ -80,79 +287,292 @@ class Database:
         if "last_manual_notification" not in user_columns:
             with self.engine.connect() as conn:
                 conn.execute(text("ALTER TABLE users ADD COLUMN last_manual_notification DATETIME"))
+        self._add_missing_columns(inspector, User.__tablename__, {
+            "updated_at": "DATETIME",
+            "is_active": "BOOLEAN NOT NULL DEFAULT 1",
+            "deactivated_at": "DATETIME",
+            "deactivation_reason": "VARCHAR",
+        })
+        self._add_missing_columns(inspector, AccessMode.__tablename__, {
+            "version": "INTEGER NOT NULL DEFAULT 0",
+        })
+        
+        self._add_missing_columns(inspector, MessageQueue.__tablename__, {
+            "attempts": "INTEGER NOT NULL DEFAULT 0",
+            "next_attempt_at": "DATETIME",
+            "last_error": "VARCHAR",
+            "dead_letter": "BOOLEAN NOT NULL DEFAULT 0",
+            "lease_owner": "VARCHAR",
+            "lease_expires_at": "DATETIME",
+            "city": "VARCHAR",
+        })
         
         if not inspector.has_table('scheduler_state'):
             SchedulerState.__table__.create(self.engine)
             with self.engine.begin() as conn:
                 conn.execute(text("INSERT INTO scheduler_state (id) VALUES (1)"))
 
+        # create_all only adds indexes together with new tables
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+    def _add_missing_columns(self, inspector, table: str, columns: dict):
+        """Add the given {name: DDL} columns to an existing table if they are missing"""
+        existing = {col["name"] for col in inspector.get_columns(table)}
+        for name, ddl in columns.items():
+            if name not in existing:
+                with self.engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
     def add_user(self, telegram_id: int, username: str, city: str) -> User:
-        user = self.session.query(User).filter_by(telegram_id=telegram_id).first()
-        if user:
-            user.username = username
-            user.city = city
-        else:
-            user = User(telegram_id=telegram_id, username=username, city=city)
-            self.session.add(user)
-        self.session.commit()
+        with self.Session.begin() as session:
+            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            if user:
+                user.username = username
+                user.city = city
+                if not user.is_active:
+                    # Talking to the bot again means the chat is reachable
+                    user.is_active = True
+                    user.deactivated_at = None
+                    user.deactivation_reason = None
+            else:
+                user = User(telegram_id=telegram_id, username=username, city=city)
+                session.add(user)
         return user
 
     def get_user(self, telegram_id: int) -> User:
-        return self.session.query(User).filter_by(telegram_id=telegram_id).first()
+        with self.Session() as session:
+            return session.query(User).filter_by(telegram_id=telegram_id).first()
+
+    def get_active_users(self) -> list:
+        """Users whose chat is still reachable, the audience of notification fan-outs"""
+        with self.Session() as session:
+            return session.query(User).filter(User.is_active == True).all()
+
+    def deactivate_users(self, reasons: dict) -> int:
+        """Mark users ({telegram_id: reason}) inactive and dead-letter their other pending messages"""
+        if not reasons:
+            return 0
+        now = self._get_utc_now()
+        deactivated = 0
+        with self.Session.begin() as session:
+            for reason in set(reasons.values()):
+                telegram_ids = [telegram_id for telegram_id, value in reasons.items() if value == reason]
+                for chunk in _chunked(telegram_ids):
+                    deactivated += session.execute(
+                        update(User)
+                        .where(User.telegram_id.in_(chunk), User.is_active == True)
+                        .values(is_active=False, deactivated_at=now, deactivation_reason=reason),
+                        execution_options={'synchronize_session': False}
+                    ).rowcount
+            for chunk in _chunked(list(reasons)):
+                session.execute(
+                    update(MessageQueue)
+                    .where(MessageQueue.telegram_id.in_(chunk), MessageQueue.sent == False,
+                           MessageQueue.dead_letter == False, MessageQueue.lease_owner.is_(None))
+                    .values(dead_letter=True, next_attempt_at=None, last_error='Chat unreachable'),
+                    execution_options={'synchronize_session': False}
+                )
+        if deactivated:
+            logging.getLogger(__name__).info(f"Deactivated {deactivated} unreachable users")
+        return deactivated
+
+    def get_user_ids_after(self, telegram_id: int = None, limit: int = BULK_CHUNK_SIZE) -> list:
+        """Next page of user ids in ascending order, for resumable walks over every user"""
+        statement = select(User.telegram_id).order_by(User.telegram_id).limit(limit)
+        if telegram_id is not None:
+            statement = statement.where(User.telegram_id > telegram_id)
+        with self.Session() as session:
+            return list(session.execute(statement).scalars())
+
+    def delete_users(self, telegram_ids: list) -> int:
+        """Delete the given users in a single transaction"""
+        deleted = 0
+        with self.Session.begin() as session:
+            for chunk in _chunked(list(telegram_ids)):
+                deleted += session.execute(delete(User).where(User.telegram_id.in_(chunk))).rowcount
+        return deleted
+
+    def _encode_cursor(self, row: UserRow, sort: str) -> str:
+        key = [row.last_notification.isoformat() if row.last_notification else None, row.telegram_id] \
+            if sort == 'last_notification' else [row.telegram_id]
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    def _decode_cursor(self, cursor: str, sort: str) -> list:
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if sort == 'last_notification':
+                return [datetime.fromisoformat(key[0]) if key[0] else None, int(key[1])]
+            return [int(key[0])]
+        except (ValueError, TypeError, IndexError, KeyError):
+            raise ValueError("Invalid cursor")
+
+    def get_user_page(self, search: str = None, sort: str = 'id', cursor: str = None, limit: int = 50) -> tuple:
+        """Get one page of the admin user list with keyset pagination.
+        Each row carries the access flag for the current mode and the formatted last notification,
+        all from a single read-only query. Returns (rows, next_cursor)."""
+        if sort not in USER_SORTS:
+            raise ValueError(f"Sort must be one of {', '.join(USER_SORTS)}")
+
+        mode = func.coalesce(select(AccessMode.mode).limit(1).scalar_subquery(), 'blocklist')
+        listed = select(AccessControl.id)\
+            .where(AccessControl.telegram_id == User.telegram_id, AccessControl.mode == mode)\
+            .exists()
+        statement = select(
+            User.telegram_id,
+            User.username,
+            User.city,
+            User.last_notification,
+            User.is_active,
+            mode.label('mode'),
+            listed.label('listed')
+        )
+
+        search = (search or '').strip()
+        if search:
+            # Prefix matches so the NOCASE indexes can be used
+            pattern = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions = [
+                User.username.like(pattern, escape='\\'),
+                User.city.like(pattern, escape='\\'),
+            ]
+            if search.isdigit():
+                conditions.append(User.telegram_id == int(search))
+            statement = statement.where(or_(*conditions))
+
+        if sort == 'last_notification':
+            # Most recent first, users never notified last
+            if cursor:
+                last_notification, telegram_id = self._decode_cursor(cursor, sort)
+                if last_notification is None:
+                    statement = statement.where(User.last_notification.is_(None), User.telegram_id < telegram_id)
+                else:
+                    statement = statement.where(or_(
+                        User.last_notification < last_notification,
+                        and_(User.last_notification == last_notification, User.telegram_id < telegram_id),
+                        User.last_notification.is_(None)
+                    ))
+            statement = statement.order_by(User.last_notification.desc(), User.telegram_id.desc())
+        else:
+            if cursor:
+                statement = statement.where(User.telegram_id > self._decode_cursor(cursor, sort)[0])
+            statement = statement.order_by(User.telegram_id)
+
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(statement.limit(limit + 1))
+            rows = [
+                UserRow(
+                    telegram_id=row.telegram_id,
+                    username=row.username,
+                    city=row.city,
+                    last_notification=row.last_notification,
+                    last_notification_display=self._format_notification_time(row.last_notification),
+                    has_access=bool(row.listed) if row.mode == 'whitelist' else not row.listed,
+                    is_active=row.is_active
+                )
+                for row in result
+            ]
 
-    def get_all_users(self):
-        return self.session.query(User).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor(rows[-1], sort)
+        return rows, next_cursor
+
+    def get_users_fingerprint(self) -> list:
+        """Cheap summary that changes whenever the admin user list could change"""
+        with self.engine.connect() as conn:
+            users = conn.execute(select(
+                func.count(User.id), func.max(User.id), func.max(User.updated_at), func.max(User.last_notification)
+            )).one()
+            access = conn.execute(select(func.count(AccessControl.id), func.max(AccessControl.id))).one()
+            mode = conn.execute(select(AccessMode.mode, AccessMode.updated_at).limit(1)).first()
+        return [str(value) for value in (*users, *access, *(mode or ()))]
+
+    def _set_user_blocked(self, telegram_id: int, blocked: bool) -> bool:
+        with self.Session.begin() as session:
+            result = session.execute(
+                update(User).where(User.telegram_id == telegram_id).values(is_blocked=blocked),
+                execution_options={'synchronize_session': False}
+            )
+            return result.rowcount > 0
 
     def block_user(self, telegram_id: int) -> bool:
-        user = self.get_user(telegram_id)
-        if user:
-            user.is_blocked = True
-            self.session.commit()
-            return True
-        return False
+        return self._set_user_blocked(telegram_id, True)
 
     def unblock_user(self, telegram_id: int) -> bool:
-        user = self.get_user(telegram_id)
-        if user:
-            user.is_blocked = False
-            self.session.commit()
-            return True
-        return False
+        return self._set_user_blocked(telegram_id, False)
 
     def set_access_mode(self, mode: str):
         if mode not in ['whitelist', 'blocklist']:
             raise ValueError("Mode must be either 'whitelist' or 'blocklist'")
-        access_mode = self.session.query(AccessMode).first()
-        access_mode.mode = mode
-        self.session.commit()
+        with self.Session.begin() as session:
+            access_mode = session.query(AccessMode).first()
+            access_mode.mode = mode
+            self._bump_access_version(session)
+        self.access_cache.invalidate()
 
     def get_access_mode(self) -> str:
-        access_mode = self.session.query(AccessMode).first()
-        return access_mode.mode if access_mode else 'blocklist'
+        with self.Session() as session:
+            mode = session.execute(select(AccessMode.mode).limit(1)).scalar()
+        return mode or 'blocklist'
 
     def add_to_list(self, mode: str, telegram_id: int):
         if mode not in ['whitelist', 'blocklist']:
             raise ValueError("Mode must be either 'whitelist' or 'blocklist'")
-        entry = AccessControl(mode=mode, telegram_id=telegram_id)
-        self.session.add(entry)
-        self.session.commit()
+        with self.Session.begin() as session:
+            session.add(AccessControl(mode=mode, telegram_id=telegram_id))
+            self._bump_access_version(session)
+        self.access_cache.invalidate()
 
     def remove_from_list(self, mode: str, telegram_id: int):
-        self.session.query(AccessControl).filter_by(
-            mode=mode, telegram_id=telegram_id
-        ).delete()
-        self.session.commit()
+        with self.Session.begin() as session:
+            removed = session.query(AccessControl).filter_by(
+                mode=mode, telegram_id=telegram_id
+            ).delete()
+            if removed:
+                self._bump_access_version(session)
+        self.access_cache.invalidate()
+
+    def _bump_access_version(self, session):
+        session.execute(
+            update(AccessMode).values(version=AccessMode.version + 1),
+            execution_options={'synchronize_session': False}
+        )
+
+    def _access_list_query(self, mode: str):
+        return select(AccessControl.telegram_id).where(AccessControl.mode == mode)
+
+    def _refresh_access_cache(self) -> AccessSnapshot:
+        """Get the current access snapshot, reloading the lists if another process changed them.
+        The version is checked at most every ACCESS_CACHE_TTL_SECONDS."""
+        cache = self.access_cache
+        snapshot = cache.snapshot
+        if snapshot is not None and time.monotonic() - snapshot.checked_at < config.ACCESS_CACHE_TTL_SECONDS:
+            return snapshot
+
+        with cache.lock:
+            snapshot = cache.snapshot
+            if snapshot is not None and time.monotonic() - snapshot.checked_at < config.ACCESS_CACHE_TTL_SECONDS:
+                return snapshot
+            with self.Session() as session:
+                row = session.execute(select(AccessMode.mode, AccessMode.version).limit(1)).first()
+                mode, version = (row.mode, row.version) if row else ('blocklist', 0)
+                if snapshot is not None and snapshot.version == version:
+                    listed = snapshot.listed
+                else:
+                    listed = frozenset(session.execute(self._access_list_query(mode)).scalars())
+                    logging.getLogger(__name__).info(f"Loaded {len(listed)} {mode} entries (access version {version})")
+            snapshot = AccessSnapshot(version, mode, listed, time.monotonic())
+            # Published with a single assignment: readers see the old snapshot or the new one
+            cache.snapshot = snapshot
+        return snapshot
 
     def check_access(self, telegram_id: int) -> bool:
-        mode = self.get_access_mode()
-        if mode == 'whitelist':
-            return bool(self.session.query(AccessControl).filter_by(
-                mode='whitelist', telegram_id=telegram_id
-            ).first())
-        else:
-            return not bool(self.session.query(AccessControl).filter_by(
-                mode='blocklist', telegram_id=telegram_id
-            ).first())
+        snapshot = self._refresh_access_cache()
+        listed = telegram_id in snapshot.listed
+        return listed if snapshot.mode == 'whitelist' else not listed
 
     def _get_utc_now(self) -> datetime:
         """Get current UTC time with timezone info"""
@@ -166,13 +586,31 @@ class Database:
 
     def update_last_notification(self, telegram_id: int, is_manual: bool = False):
         """Update the last notification timestamp for a user"""
-        user = self.get_user(telegram_id)
-        if user:
-            now = self._get_utc_now()
-            user.last_notification = now
-            if is_manual:
-                user.last_manual_notification = now
-            self.session.commit()
+        self.update_last_notifications([telegram_id], is_manual=is_manual)
+
+    def update_last_notifications(self, telegram_ids: list, is_manual: bool = False) -> int:
+        """Update the last notification timestamp of many users in a single transaction"""
+        try:
+            with self.Session.begin() as session:
+                return self._update_last_notifications(session, telegram_ids, is_manual)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error updating last notifications: {str(e)}")
+            return 0
+
+    def _update_last_notifications(self, session, telegram_ids: list, is_manual: bool) -> int:
+        now = self._get_utc_now()
+        values = {'last_notification': now}
+        if is_manual:
+            values['last_manual_notification'] = now
+
+        updated = 0
+        for chunk in _chunked(list(telegram_ids)):
+            result = session.execute(
+                update(User).where(User.telegram_id.in_(chunk)).values(**values),
+                execution_options={'synchronize_session': False}
+            )
+            updated += result.rowcount
+        return updated
 
     def can_send_manual_notification(self, telegram_id: int, cooldown_minutes: int = 5) -> bool:
         """Check if a manual notification can be sent based on cooldown time"""
@@ -186,14 +624,12 @@ class Database:
         
         return time_since_last.total_seconds() >= cooldown_minutes * 60
             
-    def format_last_notification(self, telegram_id: int) -> str:
-        """Format the last notification time for display"""
-        user = self.get_user(telegram_id)
-        if user and user.last_notification:
-            tz_aware = self._ensure_timezone_aware(user.last_notification)
-            rome_time = tz_aware.astimezone(ZoneInfo('Europe/Rome'))
-            return rome_time.strftime('%Y-%m-%d %H:%M:%S')
-        return 'Never'
+    def _format_notification_time(self, dt: datetime) -> str:
+        if not dt:
+            return 'Never'
+        tz_aware = self._ensure_timezone_aware(dt)
+        rome_time = tz_aware.astimezone(ZoneInfo('Europe/Rome'))
+        return rome_time.strftime('%Y-%m-%d %H:%M:%S')
 
     def update_scheduler_last_run(self):
         """Update the last run time of the scheduler"""
@@ -205,21 +641,21 @@ class Database:
 
     def get_scheduler_last_run(self) -> datetime:
         """Get the last time the scheduler ran"""
-        result = self.session.query(SchedulerState).first()
-        if result and result.last_run:
-            return self._ensure_timezone_aware(result.last_run)
-        return None
+        with self.Session() as session:
+            last_run = session.execute(select(SchedulerState.last_run).limit(1)).scalar()
+        return self._ensure_timezone_aware(last_run) if last_run else None
         
-    def queue_message(self, telegram_id: int, message: str) -> bool:
+    def queue_message(self, telegram_id: int, message: str, city: str = None) -> bool:
         """Queue a message to be sent by the bot process"""
         try:
-            queue_item = MessageQueue(
-                telegram_id=telegram_id,
-                message=message,
-                created_at=self._get_utc_now()
-            )
-            self.session.add(queue_item)
-            self.session.commit()
+            with self.Session.begin() as session:
+                session.add(MessageQueue(
+                    telegram_id=telegram_id,
+                    message=message,
+                    created_at=self._get_utc_now(),
+                    city=city
+                ))
+            notify_queue()
             logger = logging.getLogger(__name__)
             logger.info(f"Message queued for user {telegram_id}")
             return True
@@ -228,73 +664,526 @@ class Database:
             logger.error(f"Error queueing message: {str(e)}")
             return False
             
-    def get_pending_messages(self, limit: int = 10) -> list:
-        """Get pending messages to be sent"""
-        return self.session.query(MessageQueue)\
-            .filter(MessageQueue.sent == False)\
+    def queue_notifications(self, messages: list, is_manual: bool = False, city: str = None) -> int:
+        """Queue (telegram_id, message) pairs and update the recipients' last notification in one transaction"""
+        try:
+            with self.Session.begin() as session:
+                queued = self._insert_messages(session, messages, city)
+                self._update_last_notifications(session, [telegram_id for telegram_id, _ in messages], is_manual)
+            if queued:
+                notify_queue()
+            logging.getLogger(__name__).info(f"Queued {queued} notifications")
+            return queued
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error queueing notifications: {str(e)}")
+            return 0
+
+    def _insert_messages(self, session, messages: list, city: str = None) -> int:
+        if not messages:
+            return 0
+        now = self._get_utc_now()
+        session.execute(
+            insert(MessageQueue),
+            [
+                {'telegram_id': telegram_id, 'message': message, 'created_at': now, 'city': city}
+                for telegram_id, message in messages
+            ]
+        )
+        return len(messages)
+
+    def _due_messages_filter(self, now: datetime) -> tuple:
+        """Filter for unsent messages whose retry time has come and that nobody holds a lease on"""
+        return (
+            MessageQueue.sent == False,
+            MessageQueue.dead_letter == False,
+            or_(MessageQueue.next_attempt_at.is_(None), MessageQueue.next_attempt_at <= now),
+            or_(MessageQueue.lease_expires_at.is_(None), MessageQueue.lease_expires_at <= now),
+        )
+
+    def _due_messages_query(self, now: datetime, limit: int):
+        return select(MessageQueue.id)\
+            .where(*self._due_messages_filter(now))\
             .order_by(MessageQueue.created_at)\
-            .limit(limit)\
-            .all()
+            .limit(limit)
+
+    def claim_messages(self, worker_id: str, limit: int = 10, lease_seconds: int = None) -> list:
+        """Atomically lease up to `limit` due messages to a worker.
+        Leased messages must be acked or nacked with their lease_owner before the lease expires,
+        otherwise they become available to other workers again."""
+        now = self._get_utc_now()
+        lease_owner = f"{worker_id}:{uuid.uuid4().hex}"
+        lease_expires_at = now + timedelta(seconds=lease_seconds or config.QUEUE_LEASE_SECONDS)
+
+        due_ids = self._due_messages_query(now, limit)
+        try:
+            # A single UPDATE takes SQLite's write lock, so two workers can never lease the same row
+            with self.Session.begin() as session:
+                session.execute(
+                    update(MessageQueue)
+                    .where(MessageQueue.id.in_(due_ids))
+                    .values(lease_owner=lease_owner, lease_expires_at=lease_expires_at),
+                    execution_options={'synchronize_session': False}
+                )
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error claiming messages: {str(e)}")
+            return []
+
+        with self.Session() as session:
+            return session.query(MessageQueue)\
+                .filter(MessageQueue.lease_owner == lease_owner)\
+                .order_by(MessageQueue.created_at)\
+                .all()
+
+    def extend_lease(self, message_ids: list, lease_owner: str, lease_seconds: int = None) -> set:
+        """Push back the lease expiry of messages a worker is still sending.
+        Returns the ids still leased to `lease_owner`; the others were lost to another worker."""
+        if not message_ids:
+            return set()
+        lease_expires_at = self._get_utc_now() + timedelta(seconds=lease_seconds or config.QUEUE_LEASE_SECONDS)
+        renewed = set()
+        try:
+            with self.Session.begin() as session:
+                for chunk in _chunked(list(message_ids)):
+                    renewed.update(session.execute(
+                        update(MessageQueue)
+                        .where(
+                            MessageQueue.id.in_(chunk),
+                            MessageQueue.lease_owner == lease_owner,
+                            MessageQueue.sent == False
+                        )
+                        .values(lease_expires_at=lease_expires_at)
+                        .returning(MessageQueue.id),
+                        execution_options={'synchronize_session': False}
+                    ).scalars())
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error extending message leases: {str(e)}")
+            # Keep sending: a failed renewal is not proof the lease was lost
+            return set(message_ids)
+        return renewed
+
+    def _retry_delay(self, attempts: int) -> timedelta:
+        """Exponential backoff before the next delivery attempt"""
+        delay = config.QUEUE_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+        return timedelta(seconds=min(delay, config.QUEUE_RETRY_MAX_SECONDS))
+
+    def nack_messages(self, failures: dict, lease_owner: str = None, permanent: set = frozenset()) -> int:
+        """Release failed messages ({message_id: error}) and reschedule them with backoff,
+        dead-lettering exhausted ones and those in `permanent` right away.
+        Messages whose lease was lost to another worker are skipped.
+        Returns the number of messages moved to the dead-letter state."""
+        if not failures:
+            return 0
+        logger = logging.getLogger(__name__)
+        try:
+            now = self._get_utc_now()
+            dead_lettered = 0
+            with self.Session.begin() as session:
+                for chunk in _chunked(list(failures)):
+                    query = session.query(MessageQueue).filter(MessageQueue.id.in_(chunk))
+                    if lease_owner is not None:
+                        query = query.filter(MessageQueue.lease_owner == lease_owner)
+                    for message in query:
+                        message.lease_owner = None
+                        message.lease_expires_at = None
+                        message.attempts = (message.attempts or 0) + 1
+                        message.last_error = (failures[message.id] or 'Unknown error')[:500]
+                        if message.id in permanent or message.attempts >= config.QUEUE_MAX_ATTEMPTS:
+                            message.dead_letter = True
+                            message.next_attempt_at = None
+                            dead_lettered += 1
+                            logger.warning(
+                                f"Message {message.id} for user {message.telegram_id} dead-lettered "
+                                f"after {message.attempts} attempts: {message.last_error}"
+                            )
+                        else:
+                            message.next_attempt_at = now + self._retry_delay(message.attempts)
+            return dead_lettered
+        except Exception as e:
+            logger.error(f"Error nacking messages: {str(e)}")
+            return 0
+
+    def get_queue_stats(self) -> dict:
+        """Count queued messages by delivery state"""
+        with self.Session() as session:
+            unsent = session.query(MessageQueue).filter(MessageQueue.sent == False)
+            return {
+                'pending': unsent.filter(MessageQueue.dead_letter == False).count(),
+                'retrying': unsent.filter(MessageQueue.dead_letter == False, MessageQueue.attempts > 0).count(),
+                'dead_letter': unsent.filter(MessageQueue.dead_letter == True).count()
+            }
             
-    def mark_message_sent(self, message_id: int) -> bool:
-        """Mark a message as sent"""
+    def ack_messages(self, message_ids: list, lease_owner: str = None) -> int:
+        """Mark leased messages as sent and release their lease in a single transaction"""
+        if not message_ids:
+            return 0
         try:
-            message = self.session.query(MessageQueue).get(message_id)
-            if message:
-                message.sent = True
-                message.sent_at = self._get_utc_now()
-                self.session.commit()
-                return True
-            return False
+            now = self._get_utc_now()
+            updated = 0
+            with self.Session.begin() as session:
+                for chunk in _chunked(list(message_ids)):
+                    statement = update(MessageQueue).where(MessageQueue.id.in_(chunk))
+                    if lease_owner is not None:
+                        statement = statement.where(MessageQueue.lease_owner == lease_owner)
+                    result = session.execute(
+                        statement.values(sent=True, sent_at=now, lease_owner=None, lease_expires_at=None),
+                        execution_options={'synchronize_session': False}
+                    )
+                    updated += result.rowcount
+            return updated
         except Exception as e:
             logger = logging.getLogger(__name__)
-            logger.error(f"Error marking message as sent: {str(e)}")
-            return False
+            logger.error(f"Error acking messages: {str(e)}")
+            return 0
         
-    async def remove_blocked_users(self, bot) -> dict:
-        users = self.get_all_users()
-        total = len(users)
-        removed = 0
-        errors = []
+    def archive_messages(self, sent_before: datetime, dead_letter_before: datetime, batch_size: int) -> dict:
+        """Fold sent messages created before `sent_before` and dead letters created before `dead_letter_before`
+        into message_daily_stats and delete them. Works in batches of `batch_size` rows, one short
+        transaction each, so the sender and the admin are never locked out for long."""
+        archived = {'sent': 0, 'dead_letter': 0, 'batches': 0}
+        for outcome, sent, before in (('sent', True, sent_before), ('dead_letter', False, dead_letter_before)):
+            while True:
+                with self.Session.begin() as session:
+                    rows = session.execute(
+                        select(MessageQueue.id, MessageQueue.created_at, MessageQueue.city, MessageQueue.attempts)
+                        .where(
+                            MessageQueue.sent == sent,
+                            MessageQueue.dead_letter == (not sent),
+                            MessageQueue.created_at < before
+                        )
+                        .order_by(MessageQueue.created_at)
+                        .limit(batch_size)
+                    ).all()
+                    if not rows:
+                        break
+
+                    totals = {}
+                    for row in rows:
+                        day = self._ensure_timezone_aware(row.created_at).astimezone(config.TIMEZONE_INFO).date()
+                        key = (day.isoformat(), row.city or '')
+                        count, attempts = totals.get(key, (0, 0))
+                        totals[key] = (count + 1, attempts + (row.attempts or 0))
+
+                    statement = sqlite_insert(MessageDailyStat).values([
+                        {'day': day, 'city': city, 'outcome': outcome, 'count': count, 'attempts': attempts}
+                        for (day, city), (count, attempts) in totals.items()
+                    ])
+                    session.execute(statement.on_conflict_do_update(
+                        index_elements=['day', 'city', 'outcome'],
+                        set_={
+                            'count': MessageDailyStat.count + statement.excluded.count,
+                            'attempts': MessageDailyStat.attempts + statement.excluded.attempts,
+                        }
+                    ))
+                    session.execute(
+                        delete(MessageQueue).where(MessageQueue.id.in_([row.id for row in rows])),
+                        execution_options={'synchronize_session': False}
+                    )
+                archived[outcome] += len(rows)
+                archived['batches'] += 1
+                if len(rows) < batch_size:
+                    break
+        return archived
+
+    def get_message_archive_stats(self) -> dict:
+        """Totals of the archived messages by outcome, and the days they cover"""
+        with self.Session() as session:
+            counts = dict(session.execute(
+                select(MessageDailyStat.outcome, func.sum(MessageDailyStat.count)).group_by(MessageDailyStat.outcome)
+            ).all())
+            first_day, last_day = session.execute(
+                select(func.min(MessageDailyStat.day), func.max(MessageDailyStat.day))
+            ).one()
+        return {
+            'sent': counts.get('sent', 0),
+            'dead_letter': counts.get('dead_letter', 0),
+            'first_day': first_day,
+            'last_day': last_day
+        }
+
+    def create_job(self, kind: str, params: dict = None) -> int:
+        """Queue an admin job for the bot process and return its id"""
+        with self.Session.begin() as session:
+            job = AdminJob(kind=kind, params=json.dumps(params or {}), created_at=self._get_utc_now())
+            session.add(job)
+            session.flush()
+            job_id = job.id
+        notify_queue(JOBS_SOCKET_PATH)
+        logging.getLogger(__name__).info(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def claim_next_job(self, worker_id: str, kinds: list = None, exclude_kinds: list = None) -> dict:
+        """Atomically move the oldest queued job to running and return it, or None.
+        `kinds` limits the claim to those job kinds, `exclude_kinds` skips them."""
+        next_id = select(AdminJob.id).where(AdminJob.status == 'queued')
+        if kinds is not None:
+            next_id = next_id.where(AdminJob.kind.in_(kinds))
+        if exclude_kinds:
+            next_id = next_id.where(AdminJob.kind.not_in(exclude_kinds))
+        next_id = next_id\
+            .order_by(AdminJob.created_at, AdminJob.id)\
+            .limit(1)\
+            .scalar_subquery()
+        with self.Session.begin() as session:
+            job_id = session.execute(
+                update(AdminJob)
+                .where(AdminJob.id == next_id, AdminJob.status == 'queued')
+                .values(status='running', worker=worker_id, started_at=self._get_utc_now())
+                .returning(AdminJob.id),
+                execution_options={'synchronize_session': False}
+            ).scalar()
+        return self.get_job(job_id) if job_id is not None else None
+
+    def update_job_progress(self, job_id: int, progress: dict):
+        with self.Session.begin() as session:
+            session.execute(
+                update(AdminJob).where(AdminJob.id == job_id).values(progress=json.dumps(progress)),
+                execution_options={'synchronize_session': False}
+            )
+
+    def finish_job(self, job_id: int, result: dict = None, error: str = None, progress: dict = None):
+        """Record the outcome of a job, failed if an error is given"""
+        values = {
+            'status': 'failed' if error else 'done',
+            'result': json.dumps(result) if result is not None else None,
+            'error': error,
+            'finished_at': self._get_utc_now()
+        }
+        if progress is not None:
+            values['progress'] = json.dumps(progress)
+        with self.Session.begin() as session:
+            session.execute(
+                update(AdminJob).where(AdminJob.id == job_id).values(**values),
+                execution_options={'synchronize_session': False}
+            )
+
+    def requeue_running_jobs(self) -> int:
+        """Put jobs interrupted by a restart back in the queue, keeping their progress"""
+        with self.Session.begin() as session:
+            result = session.execute(
+                update(AdminJob)
+                .where(AdminJob.status == 'running')
+                .values(status='queued', worker=None, started_at=None),
+                execution_options={'synchronize_session': False}
+            )
+            return result.rowcount
+
+    def migrate_legacy_admin_operations(self, kinds: dict) -> int:
+        """Turn ADMIN_OPERATION rows left in the message queue by older versions into jobs.
+        `kinds` maps the legacy operation name to a job kind; unknown operations are dropped."""
         logger = logging.getLogger(__name__)
-        
-        for user in users:
-            user_id = user.telegram_id
-            logger.debug(f"Checking if user {user_id} has blocked the bot")
-            
-            try:
-                message = await bot.bot.send_message(
-                    chat_id=user_id,
-                    text="test message, please ignore",
-                    disable_notification=True
-                )
-                
-                # Message sent successfully, user has not blocked the bot
-                await bot.bot.delete_message(
-                    chat_id=user_id,
-                    message_id=message.message_id
-                )
-                logger.debug(f"User {user_id} has not blocked the bot")
-                
-            except Exception as e:
-                error_str = str(e).lower()
-                
-                # Check if user has blocked the bot
-                if "forbidden" in error_str and "blocked" in error_str:
-                    logger.info(f"Removing user {user_id} who blocked the bot")
-                    self.session.delete(user)
-                    removed += 1
+        now = self._get_utc_now()
+        migrated = 0
+        with self.Session.begin() as session:
+            rows = session.execute(
+                select(MessageQueue.id, MessageQueue.message)
+                .where(MessageQueue.telegram_id == 0, MessageQueue.sent == False,
+                       MessageQueue.message.like('ADMIN_OPERATION:%'))
+            ).all()
+            for row in rows:
+                operation = row.message.replace("ADMIN_OPERATION:", "").strip()
+                kind = kinds.get(operation)
+                if kind:
+                    session.add(AdminJob(kind=kind, params=json.dumps({}), created_at=now))
+                    migrated += 1
                 else:
-                    logger.warning(f"Error checking user {user_id}: {str(e)}")
-                    errors.append(f"User {user_id}: {str(e)}")
-        
-        # Commit changes if any users were removed
-        if removed > 0:
-            self.session.commit()
-            logger.info(f"Removed {removed} users who blocked the bot")
-            
+                    logger.warning(f"Dropping unknown legacy admin operation {operation}")
+            if rows:
+                session.execute(
+                    update(MessageQueue)
+                    .where(MessageQueue.id.in_([row.id for row in rows]))
+                    .values(sent=True, sent_at=now, lease_owner=None, lease_expires_at=None),
+                    execution_options={'synchronize_session': False}
+                )
+        return migrated
+
+    def _job_to_dict(self, job: AdminJob) -> dict:
+        started_at = self._ensure_timezone_aware(job.started_at)
+        finished_at = self._ensure_timezone_aware(job.finished_at)
+        elapsed = None
+        if started_at:
+            elapsed = ((finished_at or self._get_utc_now()) - started_at).total_seconds()
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'params': json.loads(job.params) if job.params else {},
+            'progress': json.loads(job.progress) if job.progress else {},
+            'result': json.loads(job.result) if job.result else None,
+            'error': job.error,
+            'created_at': self._ensure_timezone_aware(job.created_at).isoformat() if job.created_at else None,
+            'started_at': started_at.isoformat() if started_at else None,
+            'finished_at': finished_at.isoformat() if finished_at else None,
+            'elapsed_seconds': elapsed
+        }
+
+    def get_job(self, job_id: int) -> dict:
+        with self.Session() as session:
+            job = session.get(AdminJob, job_id)
+            return self._job_to_dict(job) if job else None
+
+    def get_recent_jobs(self, limit: int = 5) -> list:
+        with self.Session() as session:
+            jobs = session.query(AdminJob).order_by(AdminJob.id.desc()).limit(limit).all()
+            return [self._job_to_dict(job) for job in jobs]
+
+    def get_latest_job(self, kind: str) -> dict:
+        """Most recently created job of the given kind, or None"""
+        with self.Session() as session:
+            job = session.query(AdminJob).filter(AdminJob.kind == kind).order_by(AdminJob.id.desc()).first()
+            return self._job_to_dict(job) if job else None
+
+    def store_matches(self, matches: list, complete_dates: list, empty_expires_at: dict = None):
+        """Upsert matches (dicts with Match columns) and record the days they cover completely.
+        Matches of a complete day that are no longer in the data are removed.
+        Complete days without any match expire at their `empty_expires_at` entry ({date: datetime})."""
+        now = self._get_utc_now()
+        counts = {local_date: 0 for local_date in complete_dates}
+        for match in matches:
+            if match['local_date'] in counts:
+                counts[match['local_date']] += 1
+
+        with self.Session.begin() as session:
+            if complete_dates:
+                keep = {(match['local_date'], match['home']) for match in matches}
+                stale_ids = [
+                    row.id for row in session.execute(
+                        select(Match.id, Match.local_date, Match.home).where(Match.local_date.in_(complete_dates))
+                    )
+                    if (row.local_date, row.home) not in keep
+                ]
+                for chunk in _chunked(stale_ids):
+                    session.execute(delete(Match).where(Match.id.in_(chunk)))
+
+            for chunk in _chunked(matches):
+                statement = sqlite_insert(Match).values([{**match, 'updated_at': now} for match in chunk])
+                session.execute(statement.on_conflict_do_update(
+                    index_elements=['local_date', 'home'],
+                    set_={
+                        'city': statement.excluded.city,
+                        'away': statement.excluded.away,
+                        'utc_date': statement.excluded.utc_date,
+                        'status': statement.excluded.status,
+                        'updated_at': statement.excluded.updated_at,
+                    }
+                ))
+
+            if counts:
+                statement = sqlite_insert(MatchFetchState).values([
+                    {
+                        'local_date': local_date, 'fetched_at': now, 'match_count': count,
+                        'expires_at': None if count else (empty_expires_at or {}).get(local_date)
+                    }
+                    for local_date, count in counts.items()
+                ])
+                session.execute(statement.on_conflict_do_update(
+                    index_elements=['local_date'],
+                    set_={
+                        'fetched_at': statement.excluded.fetched_at,
+                        'match_count': statement.excluded.match_count,
+                        'expires_at': statement.excluded.expires_at,
+                    }
+                ))
+
+    def get_match_fetch_state(self, local_date: str) -> MatchFetchState:
+        """Get the fetch state of a day if its stored matches are complete and not expired"""
+        with self.Session() as session:
+            state = session.get(MatchFetchState, local_date)
+        if state is None:
+            return None
+        if state.expires_at and self._ensure_timezone_aware(state.expires_at) <= self._get_utc_now():
+            return None
+        return state
+
+    def get_matches_on(self, local_date: str, city: str = None) -> list:
+        """Matches of a day, optionally only those in the given normalized city"""
+        statement = select(Match).where(Match.local_date == local_date).order_by(Match.utc_date)
+        if city is not None:
+            statement = statement.where(Match.city == city)
+        with self.Session() as session:
+            return list(session.execute(statement).scalars())
+
+    def get_upcoming_matches(self, city: str, start_date: str, end_date: str) -> list:
+        """Matches in a normalized city between two local dates, inclusive"""
+        with self.Session() as session:
+            return list(session.execute(
+                select(Match)
+                .where(Match.city == city, Match.local_date >= start_date, Match.local_date <= end_date)
+                .order_by(Match.local_date, Match.utc_date)
+            ).scalars())
+
+    def get_match_stats(self) -> dict:
+        """Summary of the stored matches for the admin interface"""
+        with self.Session() as session:
+            matches, first_date, last_date = session.execute(
+                select(func.count(Match.id), func.min(Match.local_date), func.max(Match.local_date))
+            ).one()
+            days, last_fetch = session.execute(
+                select(func.count(MatchFetchState.local_date), func.max(MatchFetchState.fetched_at))
+            ).one()
         return {
-            "total_users": total,
-            "removed_users": removed,
-            "errors": errors
+            'matches': matches,
+            'days': days,
+            'first_date': first_date,
+            'last_date': last_date,
+            'last_fetch': self._format_notification_time(last_fetch)
+        }
+
+    def prune_matches(self, before_date: str) -> int:
+        """Delete matches and fetch state of days before the given local date"""
+        with self.Session.begin() as session:
+            deleted = session.execute(delete(Match).where(Match.local_date < before_date)).rowcount
+            session.execute(delete(MatchFetchState).where(MatchFetchState.local_date < before_date))
+        return deleted
+
+    def optimize_database(self, vacuum_free_ratio: float) -> dict:
+        """Refresh planner statistics, checkpoint the WAL and VACUUM when at least
+        `vacuum_free_ratio` of the file is free pages. Returns what was done and the file size before and after."""
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+            page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+            free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+            conn.exec_driver_sql("ANALYZE")
+            conn.exec_driver_sql("PRAGMA optimize")
+
+            vacuumed = bool(page_count) and free_pages / page_count >= vacuum_free_ratio
+            if vacuumed:
+                conn.exec_driver_sql("VACUUM")
+
+            # TRUNCATE also shrinks the -wal file back to zero bytes
+            busy, wal_pages, checkpointed_pages = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+            size_after = conn.exec_driver_sql("PRAGMA page_count").scalar() * page_size
+
+        return {
+            'size_before': page_count * page_size,
+            'size_after': size_after,
+            'free_pages': free_pages,
+            'vacuumed': vacuumed,
+            'checkpoint_busy': bool(busy),
+            'checkpointed_pages': checkpointed_pages
+        }
+
+    def explain_query_plans(self) -> dict:
+        """Run EXPLAIN QUERY PLAN on the hot-path queries to check they use an index"""
+        statements = {
+            'message_queue_claim': self._due_messages_query(self._get_utc_now(), limit=10),
+            'access_refresh': self._access_list_query('blocklist'),
+            'message_queue_archive': select(MessageQueue.id).where(
+                MessageQueue.sent == True, MessageQueue.dead_letter == False, MessageQueue.created_at < self._get_utc_now()
+            ).order_by(MessageQueue.created_at).limit(10),
+            'matches_on_day': select(Match).where(Match.local_date == '2000-01-01'),
+            'matches_in_city': select(Match).where(Match.city == 'roma', Match.local_date >= '2000-01-01',
+                                                   Match.local_date <= '2000-01-07'),
         }
+        plans = {}
+        with self.engine.connect() as conn:
+            for name, statement in statements.items():
+                compiled = statement.compile(dialect=self.engine.dialect)
+                params = compiled.construct_params()
+                rows = conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {compiled}",
+                    tuple(params[key] for key in compiled.positiontup)
+                ).fetchall()
+                plans[name] = [row[-1] for row in rows]
+        return plans
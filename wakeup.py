@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+# Lives on the shared ./data volume, so producers in the admin container can reach the bot's sender
+SOCKET_PATH = os.path.join('data', 'queue.sock')
+JOBS_SOCKET_PATH = os.path.join('data', 'jobs.sock')
+
+def notify_queue(path: str = SOCKET_PATH):
+    """Wake up the queue sender (or whoever listens on `path`). Never raises."""
+    if not hasattr(socket, 'AF_UNIX'):
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(b'1', path)
+    except OSError:
+        # Nobody is listening, or the listener's buffer is full and it is going to wake up anyway
+        pass
+
+class QueueWakeup:
+    """Datagram socket the queue sender or job executor sleeps on between polls"""
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self._sock = None
+        self._event = None
+
+    def open(self):
+        """Bind the socket and watch it from the running event loop"""
+        self._event = asyncio.Event()
+        if not hasattr(socket, 'AF_UNIX'):
+            logger.warning(f"Unix sockets not available, {self.path} listener falls back to polling")
+            return
+        try:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.path)
+            sock.setblocking(False)
+        except OSError as e:
+            logger.warning(f"Could not open wakeup socket {self.path}, falling back to polling: {str(e)}")
+            return
+        self._sock = sock
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable)
+        logger.info(f"Listening for wakeups on {self.path}")
+
+    def close(self):
+        if self._sock is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        except RuntimeError:
+            pass
+        self._sock.close()
+        self._sock = None
+
+    def _on_readable(self):
+        # Coalesce every pending signal into a single wakeup
+        try:
+            while self._sock.recv(64):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a producer's signal or the fallback timeout. Returns True if signalled."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True